@@ -0,0 +1,142 @@
+# activity_log_writer.py - Write-behind batching for ActivityLog inserts
+"""
+Write-behind queue for activity logs.
+
+Frame processing only enqueues a row; a background thread inserts queued
+rows in one transaction every ACTIVITY_LOG_FLUSH_SECONDS (or as soon as a
+batch fills). The queue is bounded: when it is full, ordinary rows are
+dropped and counted, while critical rows (spoofing) are written
+synchronously so they are never lost.
+
+Until start() is called (scripts, the Flask shell) rows are written
+synchronously, exactly as before.
+"""
+import atexit
+import queue
+import threading
+import logging
+from config import Config
+from models import db, ActivityLog, get_ist_now
+from pipeline_metrics import stage_timer, registry as metrics
+
+logger = logging.getLogger(__name__)
+
+metrics.describe('attendance_activity_log_dropped_total', 'Activity log rows dropped because the write queue was full')
+metrics.describe('attendance_activity_log_written_total', 'Activity log rows written by the background writer')
+
+
+class ActivityLogWriter:
+    def __init__(self, max_queue, batch_size, flush_interval):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._app = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._start_lock = threading.Lock()
+
+    @property
+    def started(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, app):
+        """Start the background flush thread (idempotent)"""
+        with self._start_lock:
+            if self.started:
+                return
+            self._app = app
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='activity-log-writer', daemon=True)
+            self._thread.start()
+            atexit.register(self.stop)
+            logger.info("✓ Activity log writer started")
+
+    def stop(self, timeout=5):
+        """Stop the thread and flush whatever is still queued"""
+        if not self.started:
+            return
+        self._stop.set()
+        self._thread.join(timeout)
+        self._flush(self._drain(None))
+
+    def submit(self, **fields):
+        """Queue one ActivityLog row (column name -> value)"""
+        fields.setdefault('timestamp', get_ist_now())
+
+        if not self.started:
+            self._write_now(fields)
+            return
+
+        try:
+            self._queue.put_nowait(fields)
+        except queue.Full:
+            if fields.get('severity') == 'critical':
+                self._write_now(fields)
+            else:
+                metrics.inc('attendance_activity_log_dropped_total')
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def _write_now(self, fields):
+        """Synchronous insert (own app context once an app is known, e.g. at shutdown)"""
+        if self._app is not None:
+            with self._app.app_context():
+                self._insert(fields)
+        else:
+            self._insert(fields)
+
+    def _insert(self, fields):
+        try:
+            with stage_timer('db_write'):
+                db.session.add(ActivityLog(**fields))
+                db.session.commit()
+        except Exception as e:
+            logger.error(f"Error writing activity log: {e}")
+            db.session.rollback()
+
+    def _drain(self, limit):
+        rows = []
+        while limit is None or len(rows) < limit:
+            try:
+                rows.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return rows
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                first = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+
+            # Let a burst accumulate into one transaction unless a batch is already waiting
+            if self._queue.qsize() < self.batch_size - 1:
+                self._stop.wait(self.flush_interval)
+            self._flush([first] + self._drain(self.batch_size - 1))
+
+    def _flush(self, rows):
+        if not rows:
+            return
+        with self._app.app_context():
+            try:
+                with stage_timer('db_write'):
+                    db.session.bulk_insert_mappings(ActivityLog, rows)
+                    db.session.commit()
+                metrics.inc('attendance_activity_log_written_total', len(rows))
+            except Exception as e:
+                logger.error(f"Error flushing {len(rows)} activity logs: {e}")
+                db.session.rollback()
+
+
+activity_log_writer = ActivityLogWriter(
+    max_queue=Config.ACTIVITY_LOG_QUEUE_SIZE,
+    batch_size=Config.ACTIVITY_LOG_BATCH_SIZE,
+    flush_interval=Config.ACTIVITY_LOG_FLUSH_SECONDS
+)
+metrics.gauge(
+    'attendance_activity_log_queue_depth',
+    activity_log_writer.pending,
+    'Activity log rows waiting to be written'
+)
@@ -1,15 +1,53 @@
 # Enhanced attendance management with 3-day absence WhatsApp alerts
 from datetime import datetime, date, time, timedelta
 import pytz
-from models import db, Student, Attendance, Alert, AbsenceTracker, ActivityLog, get_ist_now
+from models import db, Student, Attendance, Alert, AbsenceTracker, get_ist_now
 from whatsapp_service import WhatsAppService
 from config import Config
+from pipeline_metrics import stage_timer
+from activity_log_writer import activity_log_writer
 import logging
+import threading
 
 logger = logging.getLogger(__name__)
 
 IST = pytz.timezone(Config.TIMEZONE)
 
+class MarkedTodaySet:
+    """In-memory set of students already marked for the current IST day"""
+    def __init__(self):
+        self._day = None
+        self._ids = set()
+        self._lock = threading.Lock()
+
+    def _roll(self, today):
+        # New IST day: forget yesterday's students
+        if today != self._day:
+            self._day = today
+            self._ids = set()
+
+    def contains(self, student_id):
+        today = datetime.now(IST).date()
+        with self._lock:
+            self._roll(today)
+            return student_id in self._ids
+
+    def add(self, student_id):
+        today = datetime.now(IST).date()
+        with self._lock:
+            self._roll(today)
+            self._ids.add(student_id)
+
+    def preload(self, student_ids, day):
+        with self._lock:
+            self._day = day
+            self._ids = set(student_ids)
+
+    def __len__(self):
+        return len(self._ids)
+
+marked_today = MarkedTodaySet()
+
 class AttendanceService:
     def __init__(self):
         self.whatsapp = WhatsAppService()
@@ -18,6 +56,13 @@ class AttendanceService:
         """Get current date in IST"""
         return datetime.now(IST).date()
 
+    def load_marked_today(self):
+        """Seed the in-memory marked-today set from the database"""
+        today = self.get_current_date()
+        rows = db.session.query(Attendance.student_id).filter_by(date=today).distinct().all()
+        marked_today.preload((row.student_id for row in rows), today)
+        logger.info(f"Marked-today set loaded: {len(marked_today)} students")
+
     def mark_attendance(self, student_id, confidence, blink_verified=False, eye_contact_verified=False):
         """
         Mark student attendance with enhanced verification
@@ -51,10 +96,11 @@ class AttendanceService:
                 db.session.add(attendance)
                 
                 # Update absence tracker - RESET consecutive absences
-                self.update_absence_tracker(student_id, is_present=True)
-                
-                db.session.commit()
+                with stage_timer('db_write'):
+                    self.update_absence_tracker(student_id, is_present=True)
+                    db.session.commit()
                 
+                marked_today.add(student_id)
                 logger.info(f"Attendance marked for {student.name} - Blink: {blink_verified}, Eye Contact: {eye_contact_verified}")
                 
                 return {
@@ -64,6 +110,8 @@ class AttendanceService:
                     'time': current_time.strftime('%I:%M %p')
                 }
         
+        if existing:
+            marked_today.add(student_id)
         return {'success': False, 'message': 'Already marked today'}
 
     def calculate_points(self, time_in, blink_verified=False, eye_contact_verified=False):
@@ -120,17 +168,15 @@ class AttendanceService:
         try:
             message = f"🚨 SPOOFING ATTEMPT: Someone tried to mark attendance for {student_name} using {spoof_type}"
             
-            log = ActivityLog(
+            activity_log_writer.submit(
                 student_id=student_id,
                 name=student_name,
                 activity_type='spoofing_attempt',
                 message=message,
                 severity='critical',
-                spoof_type=spoof_type,
+                spoof_type=str(spoof_type) if spoof_type else None,
                 spoof_confidence=confidence
             )
-            db.session.add(log)
-            db.session.commit()
             
             logger.critical(f"🚨 {message} (confidence={confidence:.2f})")
             
@@ -139,7 +185,6 @@ class AttendanceService:
             
         except Exception as e:
             logger.error(f"Failed to log spoofing attempt: {e}")
-            db.session.rollback()
 
     def update_absence_tracker(self, student_id, is_present=True):
         """
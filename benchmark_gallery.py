@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Gallery Scaling Benchmark
+Times single-query matching, batched multi-face matching and enrollment
+duplicate detection against synthetic galleries of random unit-norm 128-d
+encodings, and reports memory per gallery representation as JSON.
+
+Representations:
+    list     - Python list of per-student arrays (the pre-matrix path)
+    float64  - contiguous (N, 128) float64 matrix (what the service uses)
+    float32  - contiguous (N, 128) float32 matrix
+
+Needs numpy only, e.g.:
+    python benchmark_gallery.py
+    python benchmark_gallery.py --sizes 1000 10000 --queries 200 --output gallery.json
+
+Peak memory at 1M is roughly 2.5 GB (float64 matrix plus the list copy).
+"""
+import sys
+import json
+import time
+import argparse
+
+import numpy as np
+
+from face_matching import (
+    ENCODING_SIZE, DUPLICATE_FACE_THRESHOLD,
+    build_gallery, match_face, match_faces, find_duplicate
+)
+
+FACE_MATCH_THRESHOLD = 0.5  # FaceRecognitionService.FACE_MATCH_THRESHOLD
+
+
+def random_encodings(rng, count, dtype=np.float64):
+    encodings = rng.standard_normal((count, ENCODING_SIZE)).astype(dtype)
+    encodings /= np.linalg.norm(encodings, axis=1, keepdims=True)
+    return encodings
+
+
+def list_memory(encodings):
+    """Bytes held by a list of separate arrays, including per-array overhead"""
+    return sys.getsizeof(encodings) + sum(sys.getsizeof(e) for e in encodings)
+
+
+def list_match(gallery, encoding, tolerance):
+    """Pre-matrix path: face_recognition.face_distance on a Python list"""
+    distances = np.linalg.norm(np.array(gallery) - encoding, axis=1)
+    index = int(np.argmin(distances))
+    return index, float(distances[index]), distances[index] <= tolerance
+
+
+def list_duplicate(gallery, encoding, threshold):
+    """Pre-matrix path: one face_distance call per stored student"""
+    for i, stored in enumerate(gallery):
+        if np.linalg.norm(np.array([stored]) - encoding, axis=1)[0] < threshold:
+            return i
+    return None
+
+
+def time_calls(func, queries, max_seconds):
+    """Per-call latencies for func(query), stopping early after max_seconds"""
+    func(queries[0])  # warm-up: first call pays allocation and BLAS setup
+    latencies = []
+    budget_start = time.perf_counter()
+    for query in queries:
+        start = time.perf_counter()
+        func(query)
+        latencies.append(time.perf_counter() - start)
+        if time.perf_counter() - budget_start > max_seconds:
+            break
+    return summarize(latencies)
+
+
+def summarize(latencies):
+    arr = np.asarray(latencies) * 1000.0
+    p50, p95 = np.percentile(arr, [50, 95])
+    return {
+        'calls': int(arr.size),
+        'mean_ms': round(float(arr.mean()), 4),
+        'p50_ms': round(float(p50), 4),
+        'p95_ms': round(float(p95), 4)
+    }
+
+
+def bench_matrix(gallery, queries, batches, max_seconds):
+    return {
+        'memory_mb': round(gallery.nbytes / 2 ** 20, 2),
+        'single_match': time_calls(
+            lambda q: match_face(gallery, q, FACE_MATCH_THRESHOLD), queries, max_seconds),
+        'batch_match': time_calls(
+            lambda b: match_faces(gallery, b, FACE_MATCH_THRESHOLD), batches, max_seconds),
+        'duplicate_check': time_calls(
+            lambda q: find_duplicate(gallery, q, DUPLICATE_FACE_THRESHOLD), queries, max_seconds)
+    }
+
+
+def bench_list(gallery, queries, batches, max_seconds, loop_max_size):
+    result = {
+        'memory_mb': round(list_memory(gallery) / 2 ** 20, 2),
+        'single_match': time_calls(
+            lambda q: list_match(gallery, q, FACE_MATCH_THRESHOLD), queries, max_seconds),
+        # The list path has no batched form: one full scan per face
+        'batch_match': time_calls(
+            lambda b: [list_match(gallery, q, FACE_MATCH_THRESHOLD) for q in b], batches, max_seconds)
+    }
+    if len(gallery) <= loop_max_size:
+        result['duplicate_check'] = time_calls(
+            lambda q: list_duplicate(gallery, q, DUPLICATE_FACE_THRESHOLD), queries, max_seconds)
+    else:
+        result['duplicate_check'] = {'skipped': f'gallery larger than --loop-max-size ({loop_max_size})'}
+    return result
+
+
+def run_size(size, args, rng):
+    # Queries are fresh random faces: nothing matches, so every check is a full scan (worst case)
+    queries = random_encodings(rng, args.queries)
+    batches = [random_encodings(rng, args.batch_size) for _ in range(args.queries)]
+
+    report = {'gallery_size': size}
+
+    gallery64 = build_gallery(random_encodings(rng, size))
+    report['float64'] = bench_matrix(gallery64, queries, batches, args.max_seconds)
+
+    gallery32 = build_gallery(gallery64, dtype=np.float32)
+    report['float32'] = bench_matrix(gallery32, queries, batches, args.max_seconds)
+    del gallery32
+
+    if 'list' in args.representations:
+        gallery_list = [row.copy() for row in gallery64]
+        report['list'] = bench_list(gallery_list, queries, batches, args.max_seconds, args.loop_max_size)
+        del gallery_list
+
+    del gallery64
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark matching as the gallery grows')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000, 1000000],
+                        help='Gallery sizes to test')
+    parser.add_argument('--queries', type=int, default=100, help='Queries per measurement')
+    parser.add_argument('--batch-size', type=int, default=5, help='Faces per batched query')
+    parser.add_argument('--max-seconds', type=float, default=20.0,
+                        help='Stop a measurement early after this many seconds')
+    parser.add_argument('--loop-max-size', type=int, default=100000,
+                        help='Largest gallery for the per-student duplicate loop')
+    parser.add_argument('--no-list', dest='representations', action='store_const',
+                        const=('float64', 'float32'), default=('float64', 'float32', 'list'),
+                        help='Skip the Python-list representation')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed')
+    parser.add_argument('--output', default=None, help='Write JSON report here instead of stdout')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    results = []
+    for size in args.sizes:
+        print(f"Benchmarking gallery of {size:,}...", file=sys.stderr)
+        results.append(run_size(size, args, rng))
+
+    report = {
+        'config': {
+            'queries': args.queries,
+            'batch_size': args.batch_size,
+            'seed': args.seed,
+            'numpy': np.__version__
+        },
+        'results': results
+    }
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
+        print(f"Benchmark report written to {args.output}")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+End-to-End Recognition Pipeline Benchmark
+Replays recorded frames through EnhancedCameraService.process_frame against a
+seeded SQLite gallery and reports FPS, per-stage latency percentiles and
+state transitions as JSON.
+
+Works offline on a CPU-only box, e.g.:
+    python benchmark_pipeline.py --frames test_images --gallery-size 1000 --repeat 50
+    python benchmark_pipeline.py --frames recording.mp4 --output run.json
+"""
+import os
+import sys
+import json
+import time
+import base64
+import argparse
+import tempfile
+import logging
+from collections import Counter
+
+import cv2
+import numpy as np
+
+from config import Config
+from logging_setup import configure_logging
+
+# Before main is imported, so its own configure_logging() call is a no-op
+configure_logging(level=logging.WARNING, json_format=False)
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+
+def load_frames(source, max_frames=None):
+    """Load frames from a directory (recursively, sorted) or a video file"""
+    frames = []
+
+    if os.path.isdir(source):
+        paths = []
+        for root, _, files in os.walk(source):
+            for name in files:
+                if name.lower().endswith(IMAGE_EXTENSIONS):
+                    paths.append(os.path.join(root, name))
+        for path in sorted(paths):
+            frame = cv2.imread(path)
+            if frame is None:
+                logger.warning(f"Could not read image: {path}")
+                continue
+            frames.append(frame)
+            if max_frames and len(frames) >= max_frames:
+                break
+    else:
+        capture = cv2.VideoCapture(source)
+        while True:
+            ok, frame = capture.read()
+            if not ok:
+                break
+            frames.append(frame)
+            if max_frames and len(frames) >= max_frames:
+                break
+        capture.release()
+
+    return frames
+
+
+def encode_frames(frames, width, jpeg_quality):
+    """Encode frames the way the dashboard does: resized JPEG, base64"""
+    encoded = []
+    for frame in frames:
+        if width and frame.shape[1] != width:
+            scale = width / float(frame.shape[1])
+            frame = cv2.resize(frame, (width, int(round(frame.shape[0] * scale))))
+        ok, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality])
+        if ok:
+            encoded.append(base64.b64encode(buffer.tobytes()).decode('ascii'))
+    return encoded
+
+
+def seed_gallery(db, Student, size, seed):
+    """Insert `size` active students with random unit-norm 128-d encodings"""
+    rng = np.random.default_rng(seed)
+    encodings = rng.standard_normal((size, 128))
+    encodings /= np.linalg.norm(encodings, axis=1, keepdims=True)
+
+    batch = []
+    for i, encoding in enumerate(encodings):
+        batch.append(Student(
+            name=f"Bench Student {i}",
+            student_id=f"BENCH{i:07d}",
+            class_name='10',
+            section='A',
+            parent_phone='0000000000',
+            face_encoding=encoding,
+            status='active'
+        ))
+        if len(batch) >= 1000:
+            db.session.add_all(batch)
+            db.session.commit()
+            batch = []
+    if batch:
+        db.session.add_all(batch)
+        db.session.commit()
+
+
+def percentiles(values):
+    """p50/p95/p99/mean in milliseconds"""
+    if not values:
+        return {'count': 0}
+    arr = np.asarray(values) * 1000.0
+    p50, p95, p99 = np.percentile(arr, [50, 95, 99])
+    return {
+        'count': int(arr.size),
+        'mean_ms': round(float(arr.mean()), 3),
+        'p50_ms': round(float(p50), 3),
+        'p95_ms': round(float(p95), 3),
+        'p99_ms': round(float(p99), 3)
+    }
+
+
+def run_benchmark(args):
+    db_dir = tempfile.mkdtemp(prefix='attendance_bench_')
+    db_path = args.db or os.path.join(db_dir, 'bench.db')
+    Config.SQLALCHEMY_DATABASE_URI = f"sqlite:///{os.path.abspath(db_path)}"
+
+    # Imported after the DB URI override so the app binds to the bench database
+    from main import app, camera_service
+    from models import db, Student
+    from pipeline_metrics import registry
+
+    frames = load_frames(args.frames, args.max_frames)
+    if not frames:
+        logger.error(f"No frames found in {args.frames}")
+        return None
+    payloads = encode_frames(frames, args.width, args.jpeg_quality)
+
+    with app.app_context():
+        db.create_all()
+        if Student.query.count() == 0:
+            seed_gallery(db, Student, args.gallery_size, args.seed)
+
+    camera_service.start_system()
+
+    registry.reset()
+    registry.record_samples = True
+
+    statuses = Counter()
+    transitions = Counter()
+    latencies = []
+    previous_status = None
+
+    with app.app_context():
+        # Warm-up frames load models and fill caches; not measured
+        for payload in payloads[:args.warmup]:
+            camera_service.process_frame(payload, session_id=args.session)
+        registry.reset()
+
+        started = time.perf_counter()
+        for _ in range(args.repeat):
+            for payload in payloads:
+                frame_start = time.perf_counter()
+                result = camera_service.process_frame(payload, session_id=args.session)
+                latencies.append(time.perf_counter() - frame_start)
+
+                status = result.get('status')
+                statuses[status] += 1
+                if previous_status is not None and status != previous_status:
+                    transitions[f"{previous_status}->{status}"] += 1
+                previous_status = status
+        elapsed = time.perf_counter() - started
+
+    camera_service.stop_system()
+    registry.record_samples = False
+
+    total_frames = len(latencies)
+    return {
+        'config': {
+            'frames_source': args.frames,
+            'unique_frames': len(payloads),
+            'repeat': args.repeat,
+            'gallery_size': args.gallery_size,
+            'seed': args.seed,
+            'width': args.width,
+            'jpeg_quality': args.jpeg_quality
+        },
+        'frames': total_frames,
+        'elapsed_s': round(elapsed, 3),
+        'fps': round(total_frames / elapsed, 2) if elapsed > 0 else 0.0,
+        'latency': percentiles(latencies),
+        'stages': {stage: percentiles(values) for stage, values in sorted(registry.samples.items())},
+        'statuses': dict(statuses),
+        'transitions': dict(transitions)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay frames through the recognition pipeline')
+    parser.add_argument('--frames', default='test_images', help='Directory of images or a video file')
+    parser.add_argument('--gallery-size', type=int, default=100, help='Number of seeded students')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed for the gallery')
+    parser.add_argument('--repeat', type=int, default=20, help='Times to replay the frame set')
+    parser.add_argument('--warmup', type=int, default=2, help='Unmeasured warm-up frames')
+    parser.add_argument('--max-frames', type=int, default=None, help='Limit frames loaded from the source')
+    parser.add_argument('--width', type=int, default=320, help='Resize frames to this width (kiosk sends 320)')
+    parser.add_argument('--jpeg-quality', type=int, default=70, help='JPEG quality (kiosk sends 70)')
+    parser.add_argument('--session', default='benchmark', help='Camera session id')
+    parser.add_argument('--db', default=None, help='SQLite path (default: fresh temp file)')
+    parser.add_argument('--output', default=None, help='Write JSON report here instead of stdout')
+    args = parser.parse_args()
+
+    report = run_benchmark(args)
+    if report is None:
+        return 1
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
+        print(f"Benchmark report written to {args.output}")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -30,7 +30,22 @@ class Config:
     MIN_FACE_SIZE_PIXELS = 70  # Smaller minimum
     MIN_FACE_BRIGHTNESS = 25   # More lenient
     MAX_FACE_BRIGHTNESS = 245
-    MIN_IMAGE_SHARPNESS = 40   # Lower threshold
+    MIN_IMAGE_SHARPNESS = 30   # Laplacian variance at QUALITY_METRICS_MAX_SIDE resolution
+    
+    # Shared quality metrics (obstruction, face quality, enrollment preview)
+    QUALITY_METRICS_MAX_SIDE = 320  # downsample longest side before measuring
+    OBSTRUCTION_MIN_BRIGHTNESS = 10
+    OBSTRUCTION_MIN_SHARPNESS = 5
+    
+    # Enrollment preview quality assessment
+    QUALITY_DETECT_MAX_SIDE = 320  # detector input size for the preview
+    QUALITY_BOX_REUSE_MAX_DISTANCE = 6  # frame-hash bits; reuse face box below this
+    QUALITY_ASSESS_MAX_CONCURRENT = 2  # extra stations get their last result back
+    
+    # Streaming enrollment over Socket.IO
+    ENROLL_STREAM_BUFFER_SIZE = 5  # best frames kept server-side per session
+    ENROLL_STREAM_MIN_FRAMES = 3
+    ENROLL_STREAM_MIN_SCORE = 0.5  # minimum preview quality score to buffer a frame
     
     # Enrollment Settings
     ENROLLMENT_NUM_JITTERS = 10
@@ -46,13 +61,22 @@ class Config:
     TEXTURE_QUALITY_THRESHOLD = 30  # Lower for speed
     LIVENESS_CONFIDENCE_THRESHOLD = 0.4  # Lower pass threshold
     
+    # Temporal blink detection (per-track EAR history)
+    BLINK_WINDOW_SECONDS = 4.0  # EAR history kept per track
+    BLINK_DIP_RATIO = 0.20  # EAR drop below the personal open-eye baseline
+    BLINK_MIN_DIP = 0.10  # ...and at least this much absolute EAR drop (beyond landmark jitter)
+    BLINK_MIN_CLOSED_SAMPLES = 2  # consecutive dipped samples a blink needs
+    BLINK_MAX_DURATION_SECONDS = 1.5  # open -> dip -> open must fit in this span
+    BLINK_VALID_SECONDS = 3.0  # a detected blink keeps counting this long
+    BLINK_TRACK_TTL = 30  # drop tracks not seen for this long
+    
     # CRITICAL: Anti-Spoofing Settings - ENHANCED SECURITY
     AUTO_BLOCK_SPOOF = True
     SPOOF_CONFIDENCE_THRESHOLD_FLAG = 0.50  # LOWERED for better blocking
     SPOOF_CONFIDENCE_THRESHOLD_BLOCK = 0.50  # Unified threshold
     
     # CRITICAL: Weighted scoring emphasizing phone detection
-    SPOOF_WEIGHT_CNN = 0.15  # Reduced (optional CNN)
+    SPOOF_WEIGHT_CNN = 0.15  # Reduced (optional CNN; FFT moire takes this slot without it)
     SPOOF_WEIGHT_TEXTURE = 0.30  # Texture matters
     SPOOF_WEIGHT_PHONE = 0.55  # CRITICAL: Phone detection is key
     SPOOF_WEIGHT_MOIRE = 0.00  # Removed for speed (included in texture)
@@ -62,15 +86,36 @@ class Config:
     # Model paths
     ANTI_SPOOF_CNN_MODEL = 'models/anti_spoof_resnet18.onnx'
     PHONE_DETECTOR_MODEL = 'models/yolov5n.pt'
+    PHONE_DETECTOR_ONNX_MODEL = 'models/yolov5n.onnx'  # export_phone_detector.py
+    PHONE_DETECTOR_ONNX_INT8_MODEL = 'models/yolov5n.int8.onnx'
     LANDMARK_PREDICTOR = 'shape_predictor_68_face_landmarks.dat'
     
+    # Phone detector backend: 'auto' (ONNX export if present, else ultralytics), 'onnx', 'ultralytics'
+    PHONE_DETECTOR_BACKEND = os.environ.get('PHONE_DETECTOR_BACKEND', 'auto').lower()
+    PHONE_DETECTOR_USE_INT8 = bool(int(os.environ.get('PHONE_DETECTOR_USE_INT8', '0')))
+    PHONE_DETECTOR_INPUT_SIZE = 640
+    PHONE_DETECTOR_CONFIDENCE = 0.25  # ONNX backend; same as the ultralytics predict default
+    PHONE_DETECTOR_NMS_IOU = 0.45
+    PHONE_DETECTOR_ONNX_THREADS = 2  # intra-op threads per inference (0 = onnxruntime default)
+    
+    # Anti-spoof CNN (ONNX, optional: the stage is skipped when the model is missing)
+    ANTI_SPOOF_CNN_INPUT_SIZE = 224
+    ANTI_SPOOF_CNN_INTRA_THREADS = 2  # per inference; concurrent kiosks each get their own
+    ANTI_SPOOF_CNN_INTER_THREADS = 1  # sequential graph execution
+    
+    # Cross-session micro-batching of CNN and phone detector inference
+    ENABLE_MICRO_BATCHING = True
+    MICRO_BATCH_MAX_SIZE = 8  # items per batched model call
+    MICRO_BATCH_MAX_WAIT_MS = 3.0  # how long the first request waits for others to join
+    MICRO_BATCH_TIMEOUT_SECONDS = 1.0  # give up on the batch and run the model directly
+    
     # WhatsApp API with DRY_RUN
     WHATSAPP_TOKEN = os.environ.get("WHATSAPP_TOKEN") or ""
     WHATSAPP_PHONE_ID = os.environ.get("WHATSAPP_PHONE_ID") or ""
     WHATSAPP_DRY_RUN = bool(int(os.environ.get("WHATSAPP_DRY_RUN", "1")))
     WHATSAPP_WEBHOOK_VERIFY_TOKEN = os.environ.get('WHATSAPP_WEBHOOK_VERIFY_TOKEN')
     
-    if not os.path.exists(PHONE_DETECTOR_MODEL):
+    if not os.path.exists(PHONE_DETECTOR_MODEL) and not os.path.exists(PHONE_DETECTOR_ONNX_MODEL):
         print(f"⚠️  CRITICAL: YOLO model missing at {PHONE_DETECTOR_MODEL}")
         print("   Download: wget https://github.com/ultralytics/yolov5/releases/download/v7.0/yolov5n.pt -O models/yolov5n.pt")
         print("   OR: pip install gdown && gdown 1Drs_Aiu7xx6S-ix95f9kNsA6ueKRpN2b -O models/yolov5n.pt")
@@ -95,6 +140,8 @@ class Config:
     RECOGNITION_COOLDOWN_SECONDS = 5
     TARGET_FPS = 5  # INCREASED: Process more frames
     MAX_WORKERS = 2
+    SPOOF_CHECK_WORKERS = 8  # shared by every kiosk; when all are busy the check runs inline
+    SPOOF_CHECK_TIMEOUT_SECONDS = 3.0  # longest wait for a speculative spoof check
     
     # OPTIMIZED: Processing timeouts
     BLINK_WAIT_TIMEOUT = 5  # REDUCED: Faster timeout
@@ -110,8 +157,58 @@ class Config:
     # OPTIMIZED: Caching for performance
     ENABLE_SPOOF_CACHE = True
     SPOOF_CACHE_TIMEOUT = 3  # seconds
+    SPOOF_CACHE_BORDERLINE_MARGIN = 0.10  # verdicts this close to the spoof threshold are never reused
+    SPOOF_CACHE_BOX_TOLERANCE = 0.15  # face box shift/resize (fraction of box size) that forces a re-check
+    SPOOF_CACHE_APPEARANCE_THRESHOLD = 12  # mean abs difference of the 16x16 gray face thumbnail
+    SPOOF_CACHE_ENCODING_THRESHOLD = 0.25  # face encoding distance that forces a re-check
+    ENABLE_BACKGROUND_PHONE_DETECTOR = True  # per-camera phone/screen detector thread
+    PHONE_DETECTOR_RATE_HZ = 2.0  # background detector passes per second
+    PHONE_DETECTOR_MAX_AGE = 1.0  # seconds; older detections fall back to an inline pass
+    PHONE_DETECTOR_CROP_MODE = True  # detect on the face neighbourhood between full-frame passes
+    PHONE_DETECTOR_CROP_SIZE = 320  # detector input size for face-crop passes
+    PHONE_DETECTOR_CROP_EXPAND = 1.5  # face sizes added on each side of the face box
+    PHONE_DETECTOR_CROP_MAX_AREA = 0.6  # crops covering more of the frame run as one full-frame pass
+    PHONE_DETECTOR_FULL_FRAME_SECONDS = 2.0  # full-frame pass at least this often (large screens)
     ENABLE_LANDMARK_CACHE = True
     LANDMARK_CACHE_TIMEOUT = 0.5  # seconds
+    LANDMARK_CACHE_BOX_TOLERANCE = 0.10  # box shift/resize as a fraction of box size
+    
+    # Duplicate-frame cache: reuse detection for near-identical frames
+    ENABLE_FRAME_HASH_CACHE = True
+    FRAME_HASH_CACHE_SIZE = 8  # entries per camera session
+    FRAME_HASH_MAX_DISTANCE = 4  # differing bits (of 64) still treated as the same frame
+    FRAME_HASH_MAX_AGE_SECONDS = 2.0  # recompute a cached detection at least this often
+    
+    # Motion gate: skip detection on static scenes with no face present
+    ENABLE_MOTION_GATE = True
+    MOTION_GATE_THRESHOLD = 4.0  # mean abs gray difference on a 32x24 thumbnail
+    MOTION_GATE_MAX_IDLE_SECONDS = 5  # force a full pass at least this often
+    
+    # Negative cache: skip the gallery search for a recently seen unknown face
+    ENABLE_UNKNOWN_FACE_CACHE = True
+    UNKNOWN_FACE_CACHE_SIZE = 8  # encodings per camera session
+    UNKNOWN_FACE_CACHE_TTL = 10  # seconds
+    UNKNOWN_FACE_CACHE_MAX_DISTANCE = 0.2  # same person as the cached unknown
+    
+    # On-demand sampling profiler (/api/admin/profile)
+    PROFILER_MAX_SECONDS = 30  # hard cap on a single profile run
+    PROFILER_DEFAULT_INTERVAL_MS = 10
+    PROFILER_MAX_OVERHEAD = 0.02  # fraction of wall time spent taking samples
+    
+    # Write-behind activity log (see activity_log_writer.py)
+    ACTIVITY_LOG_QUEUE_SIZE = 5000  # rows held in memory before dropping
+    ACTIVITY_LOG_BATCH_SIZE = 200  # rows per transaction
+    ACTIVITY_LOG_FLUSH_SECONDS = 1.0
+    
+    # Repetitive events (unknown_face, camera_obstructed) collapse into one row per session and window
+    EVENT_AGGREGATION_WINDOW_SECONDS = 30
+    
+    # Logging (queue-based; see logging_setup.py)
+    LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+    LOG_JSON = os.environ.get('LOG_JSON', 'True').lower() == 'true'
+    LOG_QUEUE_SIZE = 10000  # records buffered before new ones are dropped
+    LOG_HOT_PATH_LEVEL = os.environ.get('LOG_HOT_PATH_LEVEL', 'INFO').upper()
+    LOG_HOT_PATH_SAMPLE_EVERY = 10  # emit per-frame INFO logs for 1 in N frames
     
     # Development/Debug Settings
     SHOW_DEBUG_OVERLAY = os.environ.get('SHOW_DEBUG', 'False').lower() == 'true'
@@ -139,8 +236,11 @@ class Config:
         if not 0.95 <= total_weight <= 1.05:
             errors.append(f"Spoof weights must sum to ~1.0 (currently: {total_weight})")
         
+        if cls.PHONE_DETECTOR_BACKEND not in ('auto', 'onnx', 'ultralytics'):
+            errors.append(f"PHONE_DETECTOR_BACKEND must be auto, onnx or ultralytics (currently: {cls.PHONE_DETECTOR_BACKEND})")
+        
         # Check YOLO model
-        if not os.path.exists(cls.PHONE_DETECTOR_MODEL):
+        if not os.path.exists(cls.PHONE_DETECTOR_MODEL) and not os.path.exists(cls.PHONE_DETECTOR_ONNX_MODEL):
             print(f"⚠️  Warning: YOLO phone detector not found")
             print("   Phone detection is CRITICAL for security!")
             print("   System will use fallback edge detection (less accurate)")
@@ -162,6 +262,8 @@ class Config:
             'required_frames': cls.REQUIRED_CONSECUTIVE_FRAMES,
             'target_fps': cls.TARGET_FPS,
             'spoof_cache_enabled': cls.ENABLE_SPOOF_CACHE,
+            'frame_hash_cache_enabled': cls.ENABLE_FRAME_HASH_CACHE,
+            'motion_gate_enabled': cls.ENABLE_MOTION_GATE,
             'whatsapp_dry_run': cls.WHATSAPP_DRY_RUN
         }
 
@@ -0,0 +1,142 @@
+# enrollment_quality.py - Fast quality assessment for the enrollment preview
+"""
+Lightweight quality assessment for enrollment stations.
+
+The preview is polled several times a second, so this path:
+- runs HOG detection on a downscaled RGB copy and maps boxes back,
+- reuses the previous face box while the preview barely changes,
+- caps how many assessments run at once so enrollment stations can never
+  starve kiosk recognition of CPU; a busy server returns the station's last
+  feedback instead of queueing.
+"""
+import cv2
+import face_recognition
+import threading
+import time
+import logging
+from config import Config
+from frame_gate import FrameHashCache, compute_frame_hash
+from quality_metrics import compute_frame_metrics, score_face_quality
+
+logger = logging.getLogger(__name__)
+
+STATION_STATE_TTL = 60  # seconds before an idle station's state is dropped
+
+
+def _feedback(status, message, items=None):
+    return {'status': status, 'message': message, 'items': items or []}
+
+
+class QualityAssessor:
+    def __init__(self):
+        self._slots = threading.BoundedSemaphore(Config.QUALITY_ASSESS_MAX_CONCURRENT)
+        self._stations = {}
+        self._lock = threading.Lock()
+
+    def _get_station(self, station_id):
+        """Per-station box cache and last response, pruning idle stations"""
+        now = time.time()
+        with self._lock:
+            for key in [k for k, v in self._stations.items() if now - v['seen'] > STATION_STATE_TTL]:
+                del self._stations[key]
+
+            station = self._stations.get(station_id)
+            if station is None:
+                station = {
+                    'boxes': FrameHashCache(
+                        max_entries=1,
+                        max_distance=Config.QUALITY_BOX_REUSE_MAX_DISTANCE
+                    ),
+                    'last_response': None,
+                    'seen': now
+                }
+                self._stations[station_id] = station
+            station['seen'] = now
+            return station
+
+    def detect_faces_fast(self, frame):
+        """HOG detection on a downscaled RGB copy; boxes in original coordinates"""
+        h, w = frame.shape[:2]
+        scale = min(1.0, Config.QUALITY_DETECT_MAX_SIDE / float(max(h, w)))
+
+        small = frame
+        if scale < 1.0:
+            small = cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        rgb_small = cv2.cvtColor(small, cv2.COLOR_BGR2RGB)
+
+        locations = face_recognition.face_locations(rgb_small, number_of_times_to_upsample=1, model='hog')
+        if scale == 1.0:
+            return locations
+
+        return [
+            (int(top / scale), int(right / scale), int(bottom / scale), int(left / scale))
+            for top, right, bottom, left in locations
+        ]
+
+    def assess(self, frame, station_id):
+        """
+        Assess one preview frame.
+        Returns the same structure as /api/assess-quality always has.
+        """
+        station = self._get_station(station_id)
+
+        if not self._slots.acquire(blocking=False):
+            if station['last_response'] is not None:
+                return dict(station['last_response'], stale=True)
+            return {
+                'success': True,
+                'has_face': False,
+                'stale': True,
+                'feedback': _feedback('poor', 'Checking quality...')
+            }
+
+        try:
+            response = self._assess(frame, station)
+            station['last_response'] = response
+            return response
+        finally:
+            self._slots.release()
+
+    def _assess(self, frame, station):
+        frame_hash = compute_frame_hash(frame)
+        face_locations = station['boxes'].lookup(frame_hash)
+        if face_locations is None:
+            face_locations = self.detect_faces_fast(frame)
+            station['boxes'].store(frame_hash, face_locations)
+
+        if len(face_locations) == 0:
+            return {
+                'success': True,
+                'has_face': False,
+                'feedback': _feedback('poor', 'No face detected - position yourself in frame')
+            }
+
+        if len(face_locations) > 1:
+            return {
+                'success': True,
+                'has_face': False,
+                'feedback': _feedback('poor', 'Multiple faces detected - only one person allowed')
+            }
+
+        metrics = compute_frame_metrics(frame)
+        quality_score, quality_items = score_face_quality(metrics, face_locations[0])
+
+        if quality_score >= 0.8:
+            status = 'excellent'
+            message = '✓ Perfect! Ready to capture'
+        elif quality_score >= 0.5:
+            status = 'good'
+            message = 'Good quality - you can capture'
+        else:
+            status = 'poor'
+            message = 'Adjust position for better quality'
+
+        return {
+            'success': True,
+            'has_face': True,
+            'quality_score': quality_score,
+            'feedback': _feedback(status, message, quality_items)
+        }
+
+
+quality_assessor = QualityAssessor()
@@ -0,0 +1,54 @@
+# enrollment_session.py - Server-side best-frame buffer for streamed enrollment
+"""
+Streaming enrollment over Socket.IO.
+
+The browser streams modest-quality preview frames; each one is scored with
+the enrollment quality assessor and the best ones are kept in a small
+bounded buffer. A single commit message then encodes from the buffer, so
+no full-quality frames have to be uploaded a second time.
+"""
+import heapq
+import itertools
+import threading
+import time
+
+
+class EnrollmentSession:
+    """Bounded top-K buffer of (quality_score, frame) for one enrollment station"""
+
+    def __init__(self, user_id, max_frames):
+        self.user_id = user_id
+        self.max_frames = max_frames
+        self.started_at = time.time()
+        self.frames_seen = 0
+        self._heap = []  # min-heap: worst buffered frame at index 0
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+    def offer(self, frame, quality_score):
+        """Keep the frame if it is among the best max_frames seen so far"""
+        with self._lock:
+            self.frames_seen += 1
+            entry = (quality_score, next(self._counter), frame)
+            if len(self._heap) < self.max_frames:
+                heapq.heappush(self._heap, entry)
+                return True
+            if quality_score > self._heap[0][0]:
+                heapq.heapreplace(self._heap, entry)
+                return True
+            return False
+
+    def best_frames(self):
+        """Buffered frames, best first (ties favour the most recent frame)"""
+        with self._lock:
+            ordered = sorted(self._heap, key=lambda e: (e[0], e[1]), reverse=True)
+            return [(score, frame) for score, _, frame in ordered]
+
+    @property
+    def buffered(self):
+        with self._lock:
+            return len(self._heap)
+
+    def clear(self):
+        with self._lock:
+            self._heap = []
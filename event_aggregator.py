@@ -0,0 +1,146 @@
+# event_aggregator.py - Per-session aggregation of repetitive activity events
+"""
+Collapses repetitive events (unknown_face, camera_obstructed) into one
+ActivityLog row per camera session and event type per time window.
+
+The row carries event_count, first_seen and last_seen plus the best sample
+seen in the window (the highest-confidence unknown face, for instance).
+The dashboard is told once when a window opens and once with the summary
+when it closes, instead of once per frame.
+
+Windows close when a new event arrives after the window has elapsed, when
+sweep() runs (scheduler), when a session is released, or on shutdown.
+"""
+import atexit
+import json
+import threading
+import time
+import logging
+from config import Config
+from models import get_ist_now
+from activity_log_writer import activity_log_writer
+
+logger = logging.getLogger(__name__)
+
+
+class _Window:
+    __slots__ = ('session_id', 'activity_type', 'severity', 'opened', 'first_seen',
+                 'last_seen', 'count', 'message', 'best_confidence')
+
+    def __init__(self, session_id, activity_type, severity, message, confidence):
+        self.session_id = session_id
+        self.activity_type = activity_type
+        self.severity = severity
+        self.opened = time.monotonic()
+        self.first_seen = self.last_seen = get_ist_now()
+        self.count = 1
+        self.message = message
+        self.best_confidence = confidence
+
+    def add(self, message, confidence):
+        self.count += 1
+        self.last_seen = get_ist_now()
+        if confidence is not None and (self.best_confidence is None or confidence > self.best_confidence):
+            self.best_confidence = confidence
+            self.message = message
+
+    def summary(self, final):
+        return {
+            'session_id': self.session_id,
+            'type': self.activity_type,
+            'message': self.message,
+            'count': self.count,
+            'first_seen': self.first_seen.isoformat(),
+            'last_seen': self.last_seen.isoformat(),
+            'best_confidence': self.best_confidence,
+            'final': final
+        }
+
+
+class EventAggregator:
+    def __init__(self, window_seconds, writer, on_summary=None):
+        self.window_seconds = window_seconds
+        self.writer = writer
+        self.on_summary = on_summary  # callable(summary dict), e.g. a socket broadcast
+        self._windows = {}  # (session_id, activity_type) -> _Window
+        self._lock = threading.Lock()
+
+    def record(self, session_id, activity_type, message, severity='info', confidence=None):
+        """Count one occurrence; opens a new window if none is active"""
+        key = (session_id, activity_type)
+        closed = None
+        opened = None
+
+        with self._lock:
+            window = self._windows.get(key)
+            if window is not None and time.monotonic() - window.opened >= self.window_seconds:
+                closed = self._windows.pop(key)
+                window = None
+
+            if window is None:
+                opened = self._windows[key] = _Window(session_id, activity_type, severity, message, confidence)
+            else:
+                window.add(message, confidence)
+
+        if closed is not None:
+            self._close(closed)
+        if opened is not None:
+            self._notify(opened.summary(final=False))
+
+    def sweep(self):
+        """Close every window older than window_seconds"""
+        now = time.monotonic()
+        with self._lock:
+            expired = [k for k, w in self._windows.items() if now - w.opened >= self.window_seconds]
+            closed = [self._windows.pop(k) for k in expired]
+        for window in closed:
+            self._close(window)
+
+    def release_session(self, session_id):
+        """Close a disconnected session's windows"""
+        with self._lock:
+            keys = [k for k in self._windows if k[0] == session_id]
+            closed = [self._windows.pop(k) for k in keys]
+        for window in closed:
+            self._close(window)
+
+    def flush(self):
+        with self._lock:
+            closed = list(self._windows.values())
+            self._windows.clear()
+        for window in closed:
+            self._close(window)
+
+    def _close(self, window):
+        message = window.message
+        if window.count > 1:
+            message = f"{message} (x{window.count})"
+
+        details = {'session_id': window.session_id}
+        if window.best_confidence is not None:
+            details['best_confidence'] = round(window.best_confidence, 4)
+
+        self.writer.submit(
+            activity_type=window.activity_type,
+            message=message,
+            severity=window.severity,
+            timestamp=window.last_seen,
+            event_count=window.count,
+            first_seen=window.first_seen,
+            last_seen=window.last_seen,
+            detection_details=json.dumps(details)
+        )
+        if window.count > 1:
+            self._notify(window.summary(final=True))
+
+    def _notify(self, summary):
+        if self.on_summary is None:
+            return
+        try:
+            self.on_summary(summary)
+        except Exception as e:
+            logger.error(f"Failed to publish event summary: {e}")
+
+
+event_aggregator = EventAggregator(Config.EVENT_AGGREGATION_WINDOW_SECONDS, activity_log_writer)
+atexit.register(event_aggregator.flush)
@@ -0,0 +1,91 @@
+"""
+Export the YOLO phone detector to ONNX for the onnxruntime backend
+Optionally writes an INT8 (static QDQ) variant calibrated on sample frames.
+
+    python export_phone_detector.py
+    python export_phone_detector.py --dynamic --int8 --calibration-dir test_images
+
+Needs ultralytics for the export and onnxruntime for quantization; the
+server itself then only needs onnxruntime (PHONE_DETECTOR_BACKEND=onnx).
+"""
+import os
+import glob
+import shutil
+import argparse
+
+import cv2
+
+from config import Config
+from spoof_detection.onnx_phone_detector import letterbox, to_blob
+
+
+def export_onnx(weights, output, imgsz, opset, dynamic):
+    from ultralytics import YOLO
+
+    model = YOLO(weights)
+    exported = model.export(format='onnx', imgsz=imgsz, opset=opset, simplify=True, dynamic=dynamic)
+    if os.path.abspath(exported) != os.path.abspath(output):
+        shutil.move(exported, output)
+    print(f"ONNX model saved to {output}")
+
+
+class FrameCalibrationReader:
+    """Feeds letterboxed calibration frames, preprocessed exactly like inference"""
+
+    def __init__(self, input_name, image_paths, imgsz):
+        self.input_name = input_name
+        self.image_paths = iter(image_paths)
+        self.imgsz = imgsz
+
+    def get_next(self):
+        for path in self.image_paths:
+            frame = cv2.imread(path)
+            if frame is None:
+                continue
+            image, _, _, _ = letterbox(frame, self.imgsz)
+            return {self.input_name: to_blob(image)}
+        return None
+
+
+def quantize_int8(model_path, output, calibration_dir, imgsz, max_images):
+    import onnxruntime as ort
+    from onnxruntime.quantization import quantize_static, QuantType, QuantFormat
+
+    image_paths = sorted(
+        p for ext in ('jpg', 'jpeg', 'png', 'bmp')
+        for p in glob.glob(os.path.join(calibration_dir, '**', f'*.{ext}'), recursive=True)
+    )[:max_images]
+    if not image_paths:
+        raise SystemExit(f"No calibration images found in {calibration_dir}")
+
+    input_name = ort.InferenceSession(model_path, providers=['CPUExecutionProvider']).get_inputs()[0].name
+    quantize_static(
+        model_path,
+        output,
+        FrameCalibrationReader(input_name, image_paths, imgsz),
+        quant_format=QuantFormat.QDQ,
+        per_channel=True,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8
+    )
+    print(f"INT8 model saved to {output} (calibrated on {len(image_paths)} images)")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Export the phone detector to ONNX')
+    parser.add_argument('--weights', default=Config.PHONE_DETECTOR_MODEL, help='YOLO .pt weights')
+    parser.add_argument('--output', default=Config.PHONE_DETECTOR_ONNX_MODEL, help='Output ONNX path')
+    parser.add_argument('--imgsz', type=int, default=Config.PHONE_DETECTOR_INPUT_SIZE, help='Input size')
+    parser.add_argument('--opset', type=int, default=12, help='ONNX opset')
+    parser.add_argument('--dynamic', action='store_true',
+                        help='Dynamic input size (needed for the smaller face-crop passes)')
+    parser.add_argument('--int8', action='store_true', help='Also write the INT8 quantized model')
+    parser.add_argument('--int8-output', default=Config.PHONE_DETECTOR_ONNX_INT8_MODEL, help='Output INT8 path')
+    parser.add_argument('--calibration-dir', default='test_images', help='Frames used to calibrate INT8 ranges')
+    parser.add_argument('--max-calibration-images', type=int, default=200)
+    args = parser.parse_args()
+
+    export_onnx(args.weights, args.output, args.imgsz, args.opset, args.dynamic)
+    if args.int8:
+        quantize_int8(args.output, args.int8_output, args.calibration_dir, args.imgsz,
+                      args.max_calibration_images)
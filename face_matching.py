@@ -0,0 +1,132 @@
+# face_matching.py - Vectorized gallery matching and duplicate checks
+"""
+Gallery matching helpers (numpy only).
+
+The gallery is a contiguous (N, 128) matrix built once when encodings are
+loaded, instead of a Python list that face_recognition.face_distance has to
+convert on every call. Distances are the same Euclidean distances
+face_recognition uses, so thresholds are unchanged.
+"""
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+ENCODING_SIZE = 128
+DUPLICATE_FACE_THRESHOLD = 0.35  # enrollment: closer than this is the same person
+
+
+def build_gallery(encodings, dtype=np.float64):
+    """Stack encodings into a contiguous (N, 128) matrix"""
+    if len(encodings) == 0:
+        return np.empty((0, ENCODING_SIZE), dtype=dtype)
+    return np.ascontiguousarray(np.vstack(encodings), dtype=dtype)
+
+
+def face_distances(gallery, encoding):
+    """Euclidean distance from one encoding to every gallery row"""
+    if gallery.shape[0] == 0:
+        return np.empty((0,), dtype=gallery.dtype)
+    query = np.asarray(encoding, dtype=gallery.dtype)
+    return np.linalg.norm(gallery - query, axis=1)
+
+
+def match_face(gallery, encoding, tolerance):
+    """
+    Best gallery match for one encoding
+    Returns: (index, distance, within_tolerance); index is None for an empty gallery
+    """
+    distances = face_distances(gallery, encoding)
+    if distances.size == 0:
+        return None, None, False
+
+    index = int(np.argmin(distances))
+    distance = float(distances[index])
+    return index, distance, distance <= tolerance
+
+
+def match_faces(gallery, encodings, tolerance):
+    """
+    Best gallery match for several encodings in one matrix product
+    Returns: list of (index, distance, within_tolerance)
+    """
+    if len(encodings) == 0:
+        return []
+    if gallery.shape[0] == 0:
+        return [(None, None, False)] * len(encodings)
+
+    queries = np.asarray(encodings, dtype=gallery.dtype).reshape(-1, gallery.shape[1])
+    # |g - q|^2 = |g|^2 + |q|^2 - 2 g.q
+    gallery_sq = np.einsum('ij,ij->i', gallery, gallery)
+    query_sq = np.einsum('ij,ij->i', queries, queries)
+    sq = gallery_sq[None, :] + query_sq[:, None] - 2.0 * (queries @ gallery.T)
+    np.maximum(sq, 0, out=sq)
+
+    indices = np.argmin(sq, axis=1)
+    distances = np.sqrt(sq[np.arange(len(queries)), indices])
+    return [
+        (int(i), float(d), float(d) <= tolerance)
+        for i, d in zip(indices, distances)
+    ]
+
+
+def find_duplicate(gallery, encoding, threshold):
+    """Index of the first gallery row closer than threshold, or None"""
+    distances = face_distances(gallery, encoding)
+    hits = np.flatnonzero(distances < threshold)
+    return int(hits[0]) if hits.size else None
+
+
+class UnknownFaceCache:
+    """
+    Recent non-matching encodings for one camera session.
+
+    A cached unknown stores its best gallery distance b. By the triangle
+    inequality a new encoding at distance d from it is at least b - d from
+    every gallery row, so when b - d > threshold it cannot match and the
+    gallery search can be skipped. Entries expire after ttl seconds or
+    when the gallery version changes.
+    """
+
+    def __init__(self, max_entries, ttl, max_distance):
+        self.ttl = ttl
+        self.max_distance = max_distance
+        self._entries = deque(maxlen=max_entries)  # (encoding, best_distance, expires_at)
+        self._gallery_version = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, encoding, threshold, gallery_version):
+        """True if encoding is provably a non-match for this gallery version"""
+        now = time.monotonic()
+        with self._lock:
+            if gallery_version != self._gallery_version:
+                self._entries.clear()
+                self._gallery_version = gallery_version
+
+            while self._entries and self._entries[0][2] <= now:
+                self._entries.popleft()
+
+            if self._entries:
+                cached = np.vstack([e[0] for e in self._entries])
+                best = np.array([e[1] for e in self._entries])
+                distances = face_distances(cached, encoding)
+                if np.any((distances <= self.max_distance) & (best - distances > threshold)):
+                    self.hits += 1
+                    return True
+
+            self.misses += 1
+            return False
+
+    def store(self, encoding, best_distance, gallery_version):
+        with self._lock:
+            if gallery_version != self._gallery_version:
+                self._entries.clear()
+                self._gallery_version = gallery_version
+            self._entries.append((np.asarray(encoding, dtype=np.float64), float(best_distance), time.monotonic() + self.ttl))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -3,18 +3,29 @@ import cv2
 import face_recognition
 import dlib
 import numpy as np
-from scipy.spatial import distance as dist
 import logging
 import hashlib
-from models import Student, db, ActivityLog, get_ist_now
+import itertools
+from models import Student, db
 from datetime import datetime
 import pytz
 import json
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+import threading
 import time
+from config import Config
+from frame_gate import FrameHashCache, MotionGate
+from quality_metrics import compute_frame_metrics, check_obstruction, check_face_quality
+from face_matching import build_gallery, match_face, find_duplicate, DUPLICATE_FACE_THRESHOLD, UnknownFaceCache
+from pipeline_metrics import stage_timer, registry as metrics
+from logging_setup import get_hot_path_logger, begin_frame, frame_sampled
+from activity_log_writer import activity_log_writer
+from sampling_profiler import profiler
+from event_aggregator import event_aggregator
+from attendance_service import marked_today
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
+hot_logger = get_hot_path_logger(__name__)  # per-frame messages: sampled
 
 class FaceRecognitionService:
     def __init__(self):
@@ -29,22 +40,32 @@ class FaceRecognitionService:
         self.known_encodings = []
         self.known_names = []
         self.known_ids = []
+        self.known_matrix = build_gallery([])
+        self.gallery_version = 0  # bumped on every reload; invalidates negative caches
         self.loaded = False
         
         # State management
         self.last_state_result = None
         self.frame_skip_counter = 0
+        self._frame_seq = itertools.count()  # unique id per processed frame (landmark sharing)
         self.FRAME_SKIP = 2
-        self.camera_obstructed = False
         self.recognition_history = {}
         
+        # Per-session duplicate-frame caches and motion gates (keyed by camera session id)
+        self.frame_caches = {}
+        self.motion_gates = {}
+        self.unknown_caches = {}
+        self._sessions_lock = threading.Lock()
+        
         # FIXED: Lenient thresholds
         self.FACE_MATCH_THRESHOLD = 0.5
         self.CONFIDENCE_THRESHOLD = 0.5
         self.MIN_FACE_SIZE = 80
         
-        # Thread pool
-        self.executor = ThreadPoolExecutor(max_workers=2)
+        # Thread pool shared by every kiosk: spoof detection runs alongside liveness.
+        # A check that finds no free worker runs inline on the frame's own thread
+        self.executor = ThreadPoolExecutor(max_workers=Config.SPOOF_CHECK_WORKERS, thread_name_prefix='spoof')
+        self._spoof_slots = threading.BoundedSemaphore(Config.SPOOF_CHECK_WORKERS)
         
         # Initialize liveness detector
         from liveness_detection import LivenessDetector
@@ -86,6 +107,8 @@ class FaceRecognitionService:
                         self.known_ids.append(student.id)
                         loaded_count += 1
             
+            self.known_matrix = build_gallery(self.known_encodings)
+            self.gallery_version += 1
             self.loaded = True
             logger.info(f"✓ Loaded {loaded_count} face encodings")
             return True
@@ -95,70 +118,134 @@ class FaceRecognitionService:
             self.loaded = False
             return False
 
-    def detect_camera_obstruction(self, frame):
+    def detect_camera_obstruction(self, frame, frame_metrics=None):
         """Check if camera is obstructed"""
         try:
             if frame is None or frame.size == 0:
                 return True, "Frame is empty"
             
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            
-            avg_brightness = np.mean(gray)
-            if avg_brightness < 10:
-                return True, "Camera covered or very dark"
-            
-            laplacian_var = cv2.Laplacian(gray, cv2.CV_64F).var()
-            if laplacian_var < 5:
-                return True, "Camera shows uniform surface"
-            
-            return False, ""
+            if frame_metrics is None:
+                frame_metrics = compute_frame_metrics(frame)
+            return check_obstruction(frame_metrics)
             
         except Exception as e:
             logger.error(f"Error detecting obstruction: {e}")
             return False, ""
 
-    def validate_face_quality(self, frame, face_location):
+    def detect_faces(self, frame, frame_metrics=None):
+        """
+        Run obstruction check and HOG detection on a frame
+        Returns: (is_obstructed, obstruction_reason, face_locations)
+        """
+        is_obstructed, obstruction_reason = self.detect_camera_obstruction(frame, frame_metrics)
+        if is_obstructed:
+            return True, obstruction_reason, []
+        
+        with stage_timer('detection'):
+            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            face_locations = face_recognition.face_locations(rgb_frame, model='hog')
+        return False, "", face_locations
+
+    def _get_frame_cache(self, session_id):
+        """Get (or create) the duplicate-frame cache for a camera session"""
+        with self._sessions_lock:
+            cache = self.frame_caches.get(session_id)
+            if cache is None:
+                cache = FrameHashCache(
+                    max_entries=Config.FRAME_HASH_CACHE_SIZE,
+                    max_distance=Config.FRAME_HASH_MAX_DISTANCE,
+                    max_age=Config.FRAME_HASH_MAX_AGE_SECONDS
+                )
+                self.frame_caches[session_id] = cache
+            return cache
+
+    def _get_motion_gate(self, session_id):
+        """Get (or create) the motion gate for a camera session"""
+        with self._sessions_lock:
+            gate = self.motion_gates.get(session_id)
+            if gate is None:
+                gate = MotionGate(
+                    threshold=Config.MOTION_GATE_THRESHOLD,
+                    max_idle_seconds=Config.MOTION_GATE_MAX_IDLE_SECONDS
+                )
+                self.motion_gates[session_id] = gate
+            return gate
+
+    def _get_unknown_cache(self, session_id):
+        """Get (or create) the negative cache of unknown faces for a camera session"""
+        with self._sessions_lock:
+            cache = self.unknown_caches.get(session_id)
+            if cache is None:
+                cache = UnknownFaceCache(
+                    max_entries=Config.UNKNOWN_FACE_CACHE_SIZE,
+                    ttl=Config.UNKNOWN_FACE_CACHE_TTL,
+                    max_distance=Config.UNKNOWN_FACE_CACHE_MAX_DISTANCE
+                )
+                self.unknown_caches[session_id] = cache
+            return cache
+
+    def _detect_faces_with_metrics(self, frame):
+        """detect_faces plus the frame metrics it computed, for the later quality check"""
+        # One downsampled pass feeds both obstruction and face quality checks
+        with stage_timer('obstruction'):
+            frame_metrics = compute_frame_metrics(frame)
+        return self.detect_faces(frame, frame_metrics), frame_metrics
+
+    def _detect_with_cache(self, frame, session_id, frame_hash):
+        """
+        Reuse the detection result of an effectively unchanged frame
+        Returns (detection, frame_metrics); frame metrics are only computed
+        on a cache miss and are None on a hit.
+        """
+        if not Config.ENABLE_FRAME_HASH_CACHE or frame_hash is None:
+            return self._detect_faces_with_metrics(frame)
+        
+        cache = self._get_frame_cache(session_id)
+        detection = cache.lookup(frame_hash)
+        if detection is not None:
+            metrics.inc('attendance_frame_cache_total', result='hit')
+            return detection, None
+        
+        metrics.inc('attendance_frame_cache_total', result='miss')
+        detection, frame_metrics = self._detect_faces_with_metrics(frame)
+        cache.store(frame_hash, detection)
+        return detection, frame_metrics
+
+    def release_session(self, session_id):
+        """Drop all per-session state when a camera disconnects"""
+        with self._sessions_lock:
+            self.frame_caches.pop(session_id, None)
+            self.motion_gates.pop(session_id, None)
+            self.unknown_caches.pop(session_id, None)
+        self.liveness_detector.release_tracks(session_id)
+        from spoof_detection.ensemble_spoof import release_tracks as release_spoof_tracks
+        release_spoof_tracks(session_id)
+        event_aggregator.release_session(session_id)
+        metrics.forget('session', session_id)
+
+    def validate_face_quality(self, frame, face_location, frame_metrics=None):
         """Validate face quality"""
         try:
-            top, right, bottom, left = face_location
-            
-            face_width = right - left
-            face_height = bottom - top
-            if face_width < self.MIN_FACE_SIZE or face_height < self.MIN_FACE_SIZE:
-                return False, "Face too small - move closer"
-            
-            h, w = frame.shape[:2]
-            if left < 0 or top < 0 or right > w or bottom > h:
-                return False, "Face partially outside frame"
-            
-            face_roi = frame[top:bottom, left:right]
-            if face_roi.size == 0:
-                return False, "Invalid face region"
-            
-            gray_face = cv2.cvtColor(face_roi, cv2.COLOR_BGR2GRAY)
-            avg_brightness = np.mean(gray_face)
-            if avg_brightness < 25:
-                return False, "Face too dark"
-            if avg_brightness > 245:
-                return False, "Face overexposed"
-            
-            laplacian_var = cv2.Laplacian(gray_face, cv2.CV_64F).var()
-            if laplacian_var < 30:
-                return False, "Image blurry - hold steady"
-            
-            return True, "OK"
+            if frame_metrics is None:
+                frame_metrics = compute_frame_metrics(frame)
+            return check_face_quality(frame_metrics, face_location, self.MIN_FACE_SIZE)
             
         except Exception as e:
             logger.error(f"Error validating quality: {e}")
             return False, "Validation error"
 
-    def recognize_faces_with_state(self, frame):
+    def recognize_faces_with_state(self, frame, session_id=None, frame_hash=None, small_gray=None):
         """
         FIXED: Working recognition with proper blink prompt
+        frame_hash: optional perceptual hash of the frame; near-identical
+        frames from the same session reuse the previous detection result
+        small_gray: optional 32x24 gray thumbnail used by the motion gate
         """
         if not self._ensure_loaded():
             return ('error', 'System not initialized', {})
         
+        frame_seq = next(self._frame_seq)
+        
         # Frame skip for performance
         self.frame_skip_counter += 1
         if self.frame_skip_counter % self.FRAME_SKIP != 0:
@@ -171,30 +258,49 @@ class FaceRecognitionService:
             if frame is None or frame.size == 0:
                 return ('error', 'Invalid frame', {})
             
-            # Check obstruction
-            is_obstructed, obstruction_reason = self.detect_camera_obstruction(frame)
+            # Static scene with nobody in front: previous result still holds
+            motion_gate = self._get_motion_gate(session_id) if Config.ENABLE_MOTION_GATE else None
+            if motion_gate is not None:
+                idle_result = motion_gate.check(frame, small_gray)
+                if idle_result is not None:
+                    metrics.inc('attendance_motion_gate_skips_total')
+                    self.last_state_result = idle_result
+                    return idle_result
+            
+            # Check obstruction and detect faces (cached for unchanged frames;
+            # frame_metrics is None on a hit and computed by the quality check if needed)
+            (is_obstructed, obstruction_reason, face_locations), frame_metrics = self._detect_with_cache(
+                frame, session_id, frame_hash
+            )
             if is_obstructed:
-                if not self.camera_obstructed:
-                    self.camera_obstructed = True
-                    self._log_activity('camera_obstructed', obstruction_reason)
+                self._log_activity('camera_obstructed', obstruction_reason, session_id)
                 result = ('obstructed', obstruction_reason, {})
                 self.last_state_result = result
+                if motion_gate is not None:
+                    motion_gate.record(result, idle=True)
                 return result
-            else:
-                if self.camera_obstructed:
-                    self.camera_obstructed = False
-            
-            # Detect faces
-            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            face_locations = face_recognition.face_locations(rgb_frame, model='hog')
             
             if len(face_locations) == 0:
                 self.consecutive_frames_with_face = 0
                 self.blink_wait_started = None
                 result = ('no_face', None, {'total_faces': 0})
                 self.last_state_result = result
+                if motion_gate is not None:
+                    motion_gate.record(result, idle=True)
                 return result
             
+            if motion_gate is not None:
+                motion_gate.record(None, idle=False)
+            
+            # Someone is in front of the camera: keep the background phone detector fed
+            if session_id is not None:
+                from spoof_detection.ensemble_spoof import submit_frame as submit_phone_frame
+                phone_face_bbox = None
+                if len(face_locations) == 1:
+                    top, right, bottom, left = face_locations[0]
+                    phone_face_bbox = (left, top, right, bottom)
+                submit_phone_frame(session_id, frame, phone_face_bbox)
+            
             if len(face_locations) > 1:
                 result = ('multiple_faces', 'Only one person allowed', {'total_faces': len(face_locations)})
                 self.last_state_result = result
@@ -202,14 +308,16 @@ class FaceRecognitionService:
             
             # Single face - validate quality
             face_location = face_locations[0]
-            quality_valid, quality_msg = self.validate_face_quality(frame, face_location)
+            quality_valid, quality_msg = self.validate_face_quality(frame, face_location, frame_metrics)
             if not quality_valid:
                 result = ('error', quality_msg, {})
                 self.last_state_result = result
                 return result
             
             # Get face encoding
-            face_encodings = face_recognition.face_encodings(rgb_frame, face_locations, num_jitters=1)
+            with stage_timer('encoding'):
+                rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+                face_encodings = face_recognition.face_encodings(rgb_frame, face_locations, num_jitters=1)
             
             if len(face_encodings) == 0:
                 result = ('error', 'Could not extract face features', {})
@@ -224,25 +332,37 @@ class FaceRecognitionService:
                 self.last_state_result = result
                 return result
             
-            # Match face
-            matches = face_recognition.compare_faces(
-                self.known_encodings,
-                face_encoding,
-                tolerance=self.FACE_MATCH_THRESHOLD
-            )
-            face_distances = face_recognition.face_distance(self.known_encodings, face_encoding)
+            # Recently seen unknown face: provably no match, skip the gallery search and logging
+            unknown_cache = self._get_unknown_cache(session_id) if Config.ENABLE_UNKNOWN_FACE_CACHE else None
+            reject_distance = min(self.FACE_MATCH_THRESHOLD, 1 - self.CONFIDENCE_THRESHOLD)
+            if unknown_cache is not None:
+                if unknown_cache.lookup(face_encoding, reject_distance, self.gallery_version):
+                    metrics.inc('attendance_unknown_cache_total', result='hit')
+                    result = ('unknown', 'Face not recognized', {})
+                    self.last_state_result = result
+                    return result
+                metrics.inc('attendance_unknown_cache_total', result='miss')
             
-            if len(face_distances) == 0:
+            # Match face
+            with stage_timer('matching'):
+                best_match_index, best_distance, is_match = match_face(
+                    self.known_matrix,
+                    face_encoding,
+                    tolerance=self.FACE_MATCH_THRESHOLD
+                )
+            
+            if best_match_index is None:
                 result = ('unknown', 'Face not recognized', {})
                 self.last_state_result = result
                 return result
             
-            best_match_index = np.argmin(face_distances)
-            confidence = 1 - face_distances[best_match_index]
+            confidence = 1 - best_distance
             
             # Check match quality
-            if not matches[best_match_index] or confidence < self.CONFIDENCE_THRESHOLD:
-                self._log_activity('unknown_face', f'Low confidence: {confidence:.2f}')
+            if not is_match or confidence < self.CONFIDENCE_THRESHOLD:
+                if unknown_cache is not None:
+                    unknown_cache.store(face_encoding, best_distance, self.gallery_version)
+                self._log_activity('unknown_face', f'Low confidence: {confidence:.2f}', session_id, float(confidence))
                 result = ('unknown', f'Face not recognized (confidence: {confidence:.0%})', {})
                 self.last_state_result = result
                 return result
@@ -251,7 +371,18 @@ class FaceRecognitionService:
             student_id = self.known_ids[best_match_index]
             student_name = self.known_names[best_match_index]
             
-            logger.info(f"✓ Recognized: {student_name} (conf: {confidence:.2%})")
+            hot_logger.info("✓ Recognized: %s (conf: %.2f%%)", student_name, confidence * 100)
+            
+            # Already marked today: no need for blink, liveness or spoof checks
+            if marked_today.contains(student_id):
+                self.blink_wait_started = None
+                self.consecutive_frames_with_face = 0
+                result = ('already_marked', f'{student_name} - Already marked today', {
+                    'student_id': student_id,
+                    'student_name': student_name
+                })
+                self.last_state_result = result
+                return result
             
             # Track consecutive frames
             self.consecutive_frames_with_face += 1
@@ -259,7 +390,7 @@ class FaceRecognitionService:
             # STEP 1: Show "Please Blink" message
             if self.blink_wait_started is None:
                 self.blink_wait_started = time.time()
-                logger.info(f"⏳ Waiting for blink from {student_name}")
+                hot_logger.info("⏳ Waiting for blink from %s", student_name)
                 result = ('waiting_blink', f'👤 {student_name} - Please BLINK', {
                     'student_name': student_name,
                     'student_id': student_id
@@ -269,23 +400,42 @@ class FaceRecognitionService:
             
             # Check if blink wait timed out
             if time.time() - self.blink_wait_started > self.blink_wait_timeout:
-                logger.warning(f"⏱️ Blink timeout for {student_name}")
+                logger.warning("⏱️ Blink timeout for %s", student_name)
                 self.blink_wait_started = None
                 result = ('error', '⏱️ Timeout - Please try again and blink', {})
                 self.last_state_result = result
                 return result
             
+            # Spoof detection only needs the frame and face box. Start it now to
+            # overlap liveness once this track has blinked or its eyes are closing
+            # (this frame may complete the blink); open-eyed blink-wait frames
+            # do not pay for a spoof pass
+            top, right, bottom, left = face_location
+            face_bbox = (left, top, right - left, bottom - top)
+            track_id = (session_id, student_id)
+            spoof_args = (frame, face_bbox, face_encoding, track_id, frame_sampled())
+            spoof_future = None
+            if (self.liveness_detector.has_recent_blink(track_id)
+                    or self.liveness_detector.eyes_closing(track_id)):
+                spoof_future = self._submit_spoof_check(*spoof_args)
+            
             # STEP 2: Run liveness detection - FIXED: Use correct method name
             try:
-                is_live, liveness_conf, liveness_details = self.liveness_detector.comprehensive_liveness_check(frame)
+                with stage_timer('liveness'):
+                    is_live, liveness_conf, liveness_details = self.liveness_detector.comprehensive_liveness_check(
+                        frame, face_location=face_location, track_id=track_id,
+                        frame_seq=frame_seq
+                    )
                 
                 blink_detected = liveness_details.get('blink_detected', False)
                 blink_score = liveness_details.get('scores', {}).get('blink', 0.0)
                 
-                logger.info(f"📊 Liveness: is_live={is_live}, conf={liveness_conf:.2f}, blink={blink_detected}")
+                hot_logger.info("📊 Liveness: is_live=%s, conf=%.2f, blink=%s", is_live, liveness_conf, blink_detected)
                 
                 # Keep showing "Please Blink" until blink detected
                 if not blink_detected:
+                    if spoof_future is not None:
+                        spoof_future.cancel()
                     result = ('waiting_blink', f'👤 {student_name} - Please BLINK', {
                         'student_name': student_name,
                         'student_id': student_id,
@@ -296,40 +446,45 @@ class FaceRecognitionService:
                 
                 # Blink detected! Now check overall liveness
                 if not is_live or liveness_conf < 0.5:
-                    logger.warning(f"❌ Liveness failed: conf={liveness_conf:.2f}")
+                    logger.warning("❌ Liveness failed: conf=%.2f", liveness_conf)
+                    if spoof_future is not None:
+                        spoof_future.cancel()
                     self.blink_wait_started = None
                     result = ('error', '❌ Liveness verification failed', {})
                     self.last_state_result = result
                     return result
                 
-                logger.info(f"✅ Liveness passed for {student_name}")
+                hot_logger.info("✅ Liveness passed for %s", student_name)
                 
             except Exception as e:
-                logger.error(f"❌ Liveness error: {e}")
-                import traceback
-                traceback.print_exc()
+                logger.exception("❌ Liveness error: %s", e)
+                if spoof_future is not None:
+                    spoof_future.cancel()
                 result = ('error', 'Liveness system error', {})
                 self.last_state_result = result
                 return result
             
-            # STEP 3: Run spoof detection
-            logger.info(f"🔍 Running spoof detection for {student_name}...")
+            # STEP 3: Collect spoof detection
+            hot_logger.info("🔍 Waiting for spoof detection for %s...", student_name)
             
             try:
-                from spoof_detection.ensemble_spoof import check as spoof_check
-                
-                top, right, bottom, left = face_location
-                face_bbox = (left, top, right - left, bottom - top)
-                
-                spoof_result = spoof_check(frame, face_bbox, face_encoding)
+                if spoof_future is None:
+                    spoof_result = self._run_spoof_check(*spoof_args)
+                else:
+                    try:
+                        spoof_result = spoof_future.result(timeout=Config.SPOOF_CHECK_TIMEOUT_SECONDS)
+                    except FutureTimeoutError:
+                        if not spoof_future.cancel():
+                            raise  # already running; re-running it would only add load
+                        spoof_result = self._run_spoof_check(*spoof_args)
                 
-                logger.info(f"📊 Spoof: is_spoof={spoof_result['is_spoof']}, conf={spoof_result['confidence']:.2f}")
+                hot_logger.info("📊 Spoof: is_spoof=%s, conf=%.2f", spoof_result['is_spoof'], spoof_result['confidence'])
                 
                 if spoof_result['is_spoof']:
                     spoof_conf = spoof_result['confidence']
                     spoof_type = spoof_result['spoof_type']
                     
-                    logger.warning(f"🚨 SPOOF: {student_name} | Type: {spoof_type} | Conf: {spoof_conf:.2f}")
+                    logger.warning("🚨 SPOOF: %s | Type: %s | Conf: %.2f", student_name, spoof_type, spoof_conf)
                     
                     self._log_spoof_activity(student_id, student_name, spoof_type, spoof_conf, spoof_result['evidence'])
                     
@@ -344,22 +499,20 @@ class FaceRecognitionService:
                     self.last_state_result = result
                     return result
                 
-                logger.info(f"✅ Spoof check passed for {student_name}")
+                hot_logger.info("✅ Spoof check passed for %s", student_name)
                 
             except Exception as e:
-                logger.error(f"❌ Spoof detection error: {e}")
-                import traceback
-                traceback.print_exc()
+                logger.exception("❌ Spoof detection error: %s", e)
                 result = ('error', 'Security verification error', {})
                 self.last_state_result = result
                 return result
             
             # ALL CHECKS PASSED!
-            logger.info(f"🎉 All checks passed for {student_name}")
+            hot_logger.info("🎉 All checks passed for %s", student_name)
             
             # Require multiple consecutive frames for stability
             if self.consecutive_frames_with_face < self.required_consecutive_frames:
-                logger.info(f"Verifying stability: {self.consecutive_frames_with_face}/{self.required_consecutive_frames}")
+                hot_logger.info("Verifying stability: %d/%d", self.consecutive_frames_with_face, self.required_consecutive_frames)
                 result = ('verifying', f'Verifying... ({self.consecutive_frames_with_face}/3)', {
                     'student_id': student_id,
                     'progress': self.consecutive_frames_with_face
@@ -382,46 +535,53 @@ class FaceRecognitionService:
             return result
             
         except Exception as e:
-            logger.error(f"❌ Recognition error: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("❌ Recognition error: %s", e)
             result = ('error', f'System error: {str(e)}', {})
             self.last_state_result = result
             return result
 
-    def _log_activity(self, activity_type, message):
-        """Log activity"""
-        try:
-            log = ActivityLog(
-                activity_type=activity_type,
-                message=message,
-                timestamp=get_ist_now(),
-                severity='warning' if 'obstructed' in activity_type else 'info'
-            )
-            db.session.add(log)
-            db.session.commit()
-        except Exception as e:
-            logger.error(f"Error logging activity: {e}")
-            db.session.rollback()
+    def _submit_spoof_check(self, *args):
+        """Start _run_spoof_check on the executor, or None when every worker is busy"""
+        if not self._spoof_slots.acquire(blocking=False):
+            return None
+        future = self.executor.submit(profiler.bind(self._run_spoof_check), *args)
+        future.add_done_callback(lambda _: self._spoof_slots.release())
+        return future
+
+    def _run_spoof_check(self, frame, face_bbox, face_encoding, track_id=None, log_sampled=True):
+        """Ensemble spoof check (on the executor or inline, with the frame's log sampling)"""
+        begin_frame(log_sampled)
+        from spoof_detection.ensemble_spoof import check as spoof_check
+        return spoof_check(frame, face_bbox, face_encoding, track_id=track_id)
+
+    def _log_activity(self, activity_type, message, session_id=None, confidence=None):
+        """Log activity (aggregated per session and type)"""
+        event_aggregator.record(
+            session_id,
+            activity_type,
+            message,
+            severity='warning' if 'obstructed' in activity_type else 'info',
+            confidence=confidence
+        )
 
     def _log_spoof_activity(self, student_id, student_name, spoof_type, confidence, evidence):
         """Log spoof detection"""
         try:
-            log = ActivityLog(
-                student_id=student_id,
-                name=student_name,
-                activity_type='spoof_detected',
-                message=f"Spoof: {spoof_type} (conf={confidence:.2f})",
-                severity='critical' if confidence >= 0.7 else 'warning',
-                spoof_type=str(spoof_type) if spoof_type else None,
-                spoof_confidence=confidence,
-                detection_details=json.dumps(evidence) if evidence else None
-            )
-            db.session.add(log)
-            db.session.commit()
-        except Exception as e:
-            logger.error(f"Error logging spoof: {e}")
-            db.session.rollback()
+            details = json.dumps(evidence) if evidence else None
+        except (TypeError, ValueError) as e:
+            logger.error(f"Error serializing spoof evidence: {e}")
+            details = None
+        
+        activity_log_writer.submit(
+            student_id=student_id,
+            name=student_name,
+            activity_type='spoof_detected',
+            message=f"Spoof: {spoof_type} (conf={confidence:.2f})",
+            severity='critical' if confidence >= 0.7 else 'warning',
+            spoof_type=str(spoof_type) if spoof_type else None,
+            spoof_confidence=confidence,
+            detection_details=details
+        )
 
     def compute_face_hash(self, face_encoding):
         """Compute hash for duplicate detection"""
@@ -443,13 +603,17 @@ class FaceRecognitionService:
             if existing:
                 return True, existing
             
-            all_students = Student.query.filter(Student.face_encoding.isnot(None)).all()
+            all_students = [
+                s for s in Student.query.filter(Student.face_encoding.isnot(None)).all()
+                if s.face_encoding is not None
+            ]
+            if not all_students:
+                return False, None
             
-            for student in all_students:
-                if student.face_encoding is not None:
-                    distance = face_recognition.face_distance([student.face_encoding], face_encoding)[0]
-                    if distance < 0.35:
-                        return True, student
+            gallery = build_gallery([s.face_encoding for s in all_students])
+            index = find_duplicate(gallery, face_encoding, DUPLICATE_FACE_THRESHOLD)
+            if index is not None:
+                return True, all_students[index]
             
             return False, None
             
@@ -466,7 +630,8 @@ class FaceRecognitionService:
             if frame is None or frame.size == 0:
                 return (False, "Invalid image", None)
             
-            is_obstructed, msg = self.detect_camera_obstruction(frame)
+            frame_metrics = compute_frame_metrics(frame)
+            is_obstructed, msg = self.detect_camera_obstruction(frame, frame_metrics)
             if is_obstructed:
                 return (False, f"Image quality issue: {msg}", None)
             
@@ -485,7 +650,7 @@ class FaceRecognitionService:
                 return (False, "❌ Multiple faces detected", None)
 
             face_location = face_locations[0]
-            quality_valid, quality_msg = self.validate_face_quality(frame, face_location)
+            quality_valid, quality_msg = self.validate_face_quality(frame, face_location, frame_metrics)
             if not quality_valid:
                 return (False, f"❌ {quality_msg}", None)
 
@@ -513,9 +678,7 @@ class FaceRecognitionService:
             return (True, "✓ Enrollment successful", face_encoding)
             
         except Exception as e:
-            logger.error(f"❌ Enrollment error: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("❌ Enrollment error: %s", e)
             return (False, f"Enrollment error: {str(e)}", None)
 
     def recognize_faces(self, frame):
@@ -0,0 +1,186 @@
+# frame_gate.py - Cheap per-session checks that decide how much work a frame needs
+"""
+Frame gating helpers for the kiosk pipeline.
+
+Everything in here works on a tiny downsampled gray copy of the frame so it
+costs a fraction of a millisecond, which lets idle kiosks skip the expensive
+obstruction check and HOG detection when nothing has changed.
+"""
+import cv2
+import numpy as np
+from collections import OrderedDict
+import threading
+import time
+
+# dHash grid: 9x8 gray pixels -> 64 horizontal gradient bits
+HASH_WIDTH = 9
+HASH_HEIGHT = 8
+
+# Working size for motion detection; the hash can be derived from it too
+GATE_WIDTH = 32
+GATE_HEIGHT = 24
+
+
+def downsample_gray(frame, size=(HASH_WIDTH, HASH_HEIGHT)):
+    """Return a tiny grayscale copy of a BGR frame"""
+    if frame.ndim == 3:
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    else:
+        gray = frame
+    return cv2.resize(gray, size, interpolation=cv2.INTER_AREA)
+
+
+def compute_frame_hash(frame):
+    """
+    Difference hash (dHash) of a frame.
+    Accepts a BGR frame or an already downsampled gray image.
+    Returns a 64-bit int; near-identical frames differ in only a few bits.
+    """
+    small = downsample_gray(frame, (HASH_WIDTH, HASH_HEIGHT))
+    bits = small[:, 1:] > small[:, :-1]
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+
+def hamming_distance(hash_a, hash_b):
+    """Number of differing bits between two frame hashes"""
+    return bin(hash_a ^ hash_b).count('1')
+
+
+class FrameHashCache:
+    """
+    Small LRU of detection results keyed by perceptual frame hash.
+
+    A lookup hits when a cached hash is within max_distance bits of the
+    query, so a static scene or a student standing still reuses the previous
+    obstruction/detection result instead of recomputing it.
+
+    Entries older than max_age seconds are recomputed even if the scene has
+    not changed, so a static scene cannot pin a stale result (None: no limit).
+    """
+
+    def __init__(self, max_entries=8, max_distance=4, max_age=None):
+        self.max_entries = max_entries
+        self.max_distance = max_distance
+        self.max_age = max_age
+        self._entries = OrderedDict()  # frame hash -> (result, stored at)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, frame_hash):
+        """Return the cached result for a similar frame, or None"""
+        if frame_hash is None:
+            return None
+
+        with self._lock:
+            if self.max_age is not None:
+                now = time.monotonic()
+                for key in [k for k, (_, stored) in self._entries.items() if now - stored > self.max_age]:
+                    del self._entries[key]
+
+            best_key = None
+            best_distance = self.max_distance + 1
+            for key in self._entries:
+                distance = hamming_distance(key, frame_hash)
+                if distance < best_distance:
+                    best_key = key
+                    best_distance = distance
+                    if distance == 0:
+                        break
+
+            if best_key is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(best_key)
+            self.hits += 1
+            return self._entries[best_key][0]
+
+    def store(self, frame_hash, result):
+        """Cache a result, evicting the least recently used entry if full"""
+        if frame_hash is None:
+            return
+
+        with self._lock:
+            self._entries[frame_hash] = (result, time.monotonic())
+            self._entries.move_to_end(frame_hash)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """Drop all cached results"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Hit/miss counters for monitoring"""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+
+class MotionGate:
+    """
+    Scene-change gate for idle kiosks.
+
+    Compares a 32x24 gray thumbnail against the previous one. When the scene
+    is static and the last full pass found no face (or an obstruction), the
+    previous result is still valid and face detection can be skipped.
+    Any motion re-arms the gate on the very next frame, and a full pass is
+    forced at least every max_idle_seconds as a safety net.
+    """
+
+    def __init__(self, threshold=4.0, max_idle_seconds=5.0):
+        self.threshold = threshold
+        self.max_idle_seconds = max_idle_seconds
+        self._previous = None
+        self._idle_result = None
+        self._last_full_pass = 0.0
+        self.last_motion = 0.0
+        self.skipped = 0
+
+    def scene_changed(self, small_gray):
+        """Update the reference thumbnail and report whether the scene moved"""
+        current = small_gray.astype(np.float32)
+        previous = self._previous
+        self._previous = current
+
+        if previous is None or previous.shape != current.shape:
+            return True
+
+        self.last_motion = float(np.mean(np.abs(current - previous)))
+        return self.last_motion >= self.threshold
+
+    def check(self, frame, small_gray=None):
+        """
+        Returns the cached idle result when detection can be skipped,
+        otherwise None (caller must run the full pipeline).
+        """
+        if small_gray is None:
+            small_gray = downsample_gray(frame, (GATE_WIDTH, GATE_HEIGHT))
+
+        moved = self.scene_changed(small_gray)
+        if moved or self._idle_result is None:
+            return None
+
+        if time.time() - self._last_full_pass > self.max_idle_seconds:
+            return None
+
+        self.skipped += 1
+        return self._idle_result
+
+    def record(self, result, idle):
+        """
+        Remember the outcome of a full pass.
+        idle=True means no face was present, so a static scene can reuse it.
+        """
+        self._last_full_pass = time.time()
+        self._idle_result = result if idle else None
+
+    def reset(self):
+        """Force the next frame through the full pipeline"""
+        self._previous = None
+        self._idle_result = None
@@ -0,0 +1,143 @@
+# inference_batcher.py - Cross-session micro-batching for model inference
+"""
+Dynamic micro-batching for models shared by every kiosk.
+
+Callers submit one item and get a Future. A worker thread per model takes
+the first waiting item, keeps collecting for up to max_wait_ms (or until
+max_batch items are queued), runs one batched call and resolves each
+caller's future with its own result. Items arriving while a batch runs
+are queued for the next one.
+
+Only models that take a real batch benefit: the ONNX anti-spoof CNN
+(dynamic batch axis) and the phone detector. dlib face embeddings are
+computed per image by face_recognition and are not batched.
+"""
+import threading
+import time
+import logging
+from collections import deque
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
+from pipeline_metrics import registry as metrics
+from sampling_profiler import profiler
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+
+metrics.describe('attendance_batch_size', 'Items per batched model call', buckets=BATCH_SIZE_BUCKETS)
+metrics.describe('attendance_batch_queue_wait_seconds', 'Time an item waited before its batch ran')
+metrics.describe('attendance_batch_inference_seconds', 'Duration of one batched model call')
+
+
+class MicroBatcher:
+    """
+    batch_fn(items) must return one result per item, in order.
+    submit(item) -> Future; calling the batcher waits for the result.
+    """
+    def __init__(self, name, batch_fn, max_batch=8, max_wait_ms=3.0):
+        self.name = name
+        self.batch_fn = batch_fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self._pending = deque()  # (item, future, enqueue time)
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopped = False
+
+    def submit(self, item):
+        future = Future()
+        with self._cond:
+            if self._stopped:
+                raise RuntimeError(f"{self.name} batcher is stopped")
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name=f'batch-{self.name}', daemon=True)
+                self._thread.start()
+            self._pending.append((item, future, time.perf_counter()))
+            self._cond.notify()
+        return future
+
+    def __call__(self, item, timeout=None):
+        """
+        Wait for the result. After timeout the item is withdrawn and
+        TimeoutError raised only if its batch has not started; a running
+        batch is waited for, so the caller never runs the item twice.
+        """
+        future = self.submit(item)
+        try:
+            return future.result(timeout)
+        except FutureTimeoutError:
+            if future.cancel():
+                raise
+            return future.result()
+
+    def pending(self):
+        with self._cond:
+            return len(self._pending)
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+
+    def _next_batch(self):
+        with self._cond:
+            self._cond.wait_for(lambda: self._pending or self._stopped)
+            if not self._pending:
+                return None
+
+            # Give other sessions up to max_wait after the oldest item to join
+            deadline = self._pending[0][2] + self.max_wait
+            while len(self._pending) < self.max_batch and not self._stopped:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+            # Callers that timed out cancel their future; drop those items
+            batch = []
+            while self._pending and len(batch) < self.max_batch:
+                entry = self._pending.popleft()
+                if entry[1].set_running_or_notify_cancel():
+                    batch.append(entry)
+            return batch
+
+    def _run(self):
+        with profiler.worker_scope(f'batch-{self.name}'):
+            while True:
+                batch = self._next_batch()
+                if batch is None:
+                    return
+                if not batch:
+                    continue
+
+                try:
+                    self._run_batch(batch)
+                except Exception as e:
+                    # Never let the worker die: queued callers would wait forever
+                    logger.error(f"Batcher {self.name} error: {e}")
+                    for _, future, _ in batch:
+                        if not future.done():
+                            future.set_exception(e)
+
+    def _run_batch(self, batch):
+        started = time.perf_counter()
+        for _, _, enqueued in batch:
+            metrics.observe('attendance_batch_queue_wait_seconds', started - enqueued, model=self.name)
+        metrics.observe('attendance_batch_size', len(batch), model=self.name)
+
+        try:
+            results = self.batch_fn([item for item, _, _ in batch])
+            if len(results) != len(batch):
+                raise RuntimeError(f"{self.name}: {len(results)} results for {len(batch)} items")
+        except Exception as e:
+            logger.error(f"Batched {self.name} inference failed: {e}")
+            for _, future, _ in batch:
+                future.set_exception(e)
+            return
+        finally:
+            metrics.observe('attendance_batch_inference_seconds', time.perf_counter() - started,
+                            model=self.name)
+
+        for (_, future, _), result in zip(batch, results):
+            future.set_result(result)
@@ -5,11 +5,240 @@ More lenient thresholds, better user experience
 import cv2
 import numpy as np
 import dlib
-from scipy.spatial import distance as dist
+import threading
 import time
 import logging
+from collections import deque
+from config import Config
+from logging_setup import get_hot_path_logger
+from pipeline_metrics import registry as metrics
 
 logger = logging.getLogger(__name__)
+hot_logger = get_hot_path_logger(__name__)  # per-frame messages: sampled
+
+# Landmark indices: [outer corner, top x2, inner corner, bottom x2] per eye
+RIGHT_EYE = slice(36, 42)
+LEFT_EYE = slice(42, 48)
+
+def eye_aspect_ratios(eyes):
+    """
+    Vectorized EAR for any number of eyes
+    eyes: (..., 6, 2) landmark array; returns EAR with shape eyes.shape[:-2]
+    """
+    eyes = np.asarray(eyes, dtype=np.float64)
+    vertical = np.linalg.norm(eyes[..., [1, 2], :] - eyes[..., [5, 4], :], axis=-1).sum(axis=-1)
+    horizontal = np.linalg.norm(eyes[..., 0, :] - eyes[..., 3, :], axis=-1)
+    return vertical / (2.0 * horizontal + 1e-6)
+
+class BlinkTracker:
+    """
+    EAR history for one tracked face.
+    A blink is an open -> dip -> open shape: at least BLINK_MIN_CLOSED_SAMPLES
+    consecutive samples below the face's own open-eye baseline (by
+    BLINK_DIP_RATIO and by BLINK_MIN_DIP absolute), with open samples on both
+    sides within BLINK_MAX_DURATION_SECONDS. A partial closure still counts,
+    so a fully closed frame is not required, but a single jittery landmark
+    sample does not.
+    """
+    def __init__(self):
+        self.samples = deque(maxlen=64)  # (timestamp, ear)
+        self.blinks = 0
+        self.last_blink_time = None
+        self.last_seen = 0.0
+
+    def baseline(self):
+        """Open-eye EAR for this face (upper quartile of the history)"""
+        if len(self.samples) < 3:
+            return None
+        return float(np.percentile([ear for _, ear in self.samples], 75))
+
+    def add(self, ear, now=None):
+        """Record a sample; returns True if it completes a blink"""
+        now = time.time() if now is None else now
+        self.last_seen = now
+        self.samples.append((now, float(ear)))
+        while self.samples and now - self.samples[0][0] > Config.BLINK_WINDOW_SECONDS:
+            self.samples.popleft()
+
+        baseline = self.baseline()
+        if baseline is None or len(self.samples) < 3:
+            return False
+
+        times = np.array([t for t, _ in self.samples])
+        ears = np.array([e for _, e in self.samples])
+        closed = ears < self._closed_threshold(baseline)
+        open_ = ears >= baseline * (1.0 - Config.BLINK_DIP_RATIO / 2)
+
+        # The newest sample must be the reopening; look back for the dip
+        if not open_[-1]:
+            return False
+        dips = np.flatnonzero(closed[:-1])
+        if dips.size == 0:
+            return False
+        dip = dips[-1]
+        start = dip
+        while start > 0 and closed[start - 1]:
+            start -= 1
+        if dip - start + 1 < Config.BLINK_MIN_CLOSED_SAMPLES:
+            return False
+        opened_before = np.flatnonzero(open_[:start])
+        if opened_before.size == 0:
+            return False
+        if times[-1] - times[opened_before[-1]] > Config.BLINK_MAX_DURATION_SECONDS:
+            return False
+
+        # Consume the dip so it is not counted again
+        for _ in range(dip + 1):
+            self.samples.popleft()
+        self.blinks += 1
+        self.last_blink_time = now
+        return True
+
+    @staticmethod
+    def _closed_threshold(baseline):
+        return min(baseline * (1.0 - Config.BLINK_DIP_RATIO), baseline - Config.BLINK_MIN_DIP)
+
+    def closed_run(self):
+        """Number of newest consecutive samples dipped below the baseline (eyes closing now)"""
+        baseline = self.baseline()
+        if baseline is None:
+            return 0
+        threshold = self._closed_threshold(baseline)
+        run = 0
+        for _, ear in reversed(self.samples):
+            if ear >= threshold:
+                break
+            run += 1
+        return run
+
+    def recently_blinked(self, now=None):
+        now = time.time() if now is None else now
+        return self.last_blink_time is not None and now - self.last_blink_time <= Config.BLINK_VALID_SECONDS
+
+# 3D reference points (nose tip, chin, eye corners, mouth corners) and their landmark indices
+POSE_MODEL_POINTS = np.array([
+    (0.0, 0.0, 0.0),
+    (0.0, -330.0, -65.0),
+    (-225.0, 170.0, -135.0),
+    (225.0, 170.0, -135.0),
+    (-150.0, -150.0, -125.0),
+    (150.0, -150.0, -125.0)
+], dtype=np.float64)
+POSE_LANDMARKS = [30, 8, 36, 45, 48, 54]
+POSE_DIST_COEFFS = np.zeros((4, 1))
+POSE_WARM_START_MAX_AGE = 1.0  # seconds; older poses are solved from scratch
+
+_camera_matrices = {}
+
+def camera_matrix(frame_shape):
+    """Approximate intrinsics (focal length = width), cached per frame size"""
+    h, w = frame_shape[:2]
+    matrix = _camera_matrices.get((h, w))
+    if matrix is None:
+        matrix = np.array([
+            [w, 0, w / 2],
+            [0, w, h / 2],
+            [0, 0, 1]
+        ], dtype=np.float64)
+        matrix.setflags(write=False)
+        _camera_matrices[(h, w)] = matrix
+    return matrix
+
+def rotation_to_euler(rotation_mat):
+    """(pitch, yaw, roll) in degrees, same convention as decomposeProjectionMatrix"""
+    sy = np.hypot(rotation_mat[0, 0], rotation_mat[1, 0])
+    pitch = np.degrees(np.arctan2(rotation_mat[2, 1], rotation_mat[2, 2]))
+    yaw = np.degrees(np.arctan2(-rotation_mat[2, 0], sy))
+    roll = np.degrees(np.arctan2(rotation_mat[1, 0], rotation_mat[0, 0]))
+    return float(pitch), float(yaw), float(roll)
+
+class HeadPoseEstimator:
+    """
+    solvePnP head pose for one track, warm-started from the previous
+    rotation/translation (useExtrinsicGuess) while it is recent
+    """
+    def __init__(self):
+        self.rvec = None
+        self.tvec = None
+        self.updated = 0.0
+
+    def reset(self):
+        self.rvec = None
+        self.tvec = None
+
+    def _solve(self, landmarks, frame_shape, rvec=None, tvec=None):
+        image_points = np.asarray(landmarks, dtype=np.float64)[POSE_LANDMARKS]
+        if rvec is not None:
+            return cv2.solvePnP(
+                POSE_MODEL_POINTS, image_points, camera_matrix(frame_shape), POSE_DIST_COEFFS,
+                rvec.copy(), tvec.copy(), useExtrinsicGuess=True, flags=cv2.SOLVEPNP_ITERATIVE
+            )
+        return cv2.solvePnP(
+            POSE_MODEL_POINTS, image_points, camera_matrix(frame_shape), POSE_DIST_COEFFS,
+            flags=cv2.SOLVEPNP_ITERATIVE
+        )
+
+    def estimate(self, landmarks, frame_shape):
+        """Returns (pitch, yaw, roll) in degrees; (0, 0, 0) if the solve fails"""
+        now = time.time()
+        warm = self.rvec is not None and now - self.updated <= POSE_WARM_START_MAX_AGE
+        success, rvec, tvec = self._solve(landmarks, frame_shape, *((self.rvec, self.tvec) if warm else ()))
+        if not success:
+            self.reset()
+            return 0, 0, 0
+
+        self.rvec, self.tvec, self.updated = rvec, tvec, now
+        rotation_mat, _ = cv2.Rodrigues(rvec)
+        return rotation_to_euler(rotation_mat)
+
+    def estimate_batch(self, landmarks_list, frame_shape):
+        """Poses for several faces in one frame (no warm start: different faces)"""
+        poses = []
+        for landmarks in landmarks_list:
+            success, rvec, _ = self._solve(landmarks, frame_shape)
+            if not success:
+                poses.append((0, 0, 0))
+                continue
+            rotation_mat, _ = cv2.Rodrigues(rvec)
+            poses.append(rotation_to_euler(rotation_mat))
+        return poses
+
+class LandmarkCache:
+    """
+    Last landmarks computed for one track.
+    Same frame (frame_seq) and same box: always reused, so every stage of a
+    frame shares one predictor run. Across frames: reused only when the caller
+    allows stale landmarks, within LANDMARK_CACHE_TIMEOUT and while the box
+    stays within LANDMARK_CACHE_BOX_TOLERANCE.
+    """
+    def __init__(self, ttl, box_tolerance):
+        self.ttl = ttl
+        self.box_tolerance = box_tolerance
+        self.entry = None  # (frame_seq, face_location, landmarks, timestamp)
+        self.hits = 0
+        self.misses = 0
+
+    def _box_close(self, a, b):
+        top, right, bottom, left = a
+        size = max(right - left, bottom - top, 1)
+        return max(abs(x - y) for x, y in zip(a, b)) <= self.box_tolerance * size
+
+    def get(self, frame_seq, face_location, allow_stale=False):
+        """Returns (landmarks, same_frame) or (None, False)"""
+        if self.entry is not None:
+            seq, location, landmarks, stamp = self.entry
+            if self._box_close(location, face_location):
+                if frame_seq is not None and seq == frame_seq:
+                    self.hits += 1
+                    return landmarks, True
+                if allow_stale and time.time() - stamp <= self.ttl:
+                    self.hits += 1
+                    return landmarks, False
+        self.misses += 1
+        return None, False
+
+    def put(self, frame_seq, face_location, landmarks):
+        self.entry = (frame_seq, tuple(face_location), landmarks, time.time())
 
 class LivenessDetector:
     def __init__(self):
@@ -34,18 +263,57 @@ class LivenessDetector:
         self.last_verification_time = 0
         self.verification_history = []
         
-        # Blink detection state
-        self.eyes_closed_frames = 0
-        self.blink_in_progress = False
+        # Blink detection state: one EAR history per tracked face
+        self.blink_trackers = {}
+        self.landmark_caches = {}
+        self.pose_estimators = {}
+        self._trackers_lock = threading.Lock()
+    
+    def get_blink_tracker(self, track_id):
+        """Get (or create) the blink tracker for a face track, pruning idle tracks"""
+        now = time.time()
+        with self._trackers_lock:
+            for key in [k for k, t in self.blink_trackers.items() if now - t.last_seen > Config.BLINK_TRACK_TTL]:
+                del self.blink_trackers[key]
+                self.landmark_caches.pop(key, None)
+                self.pose_estimators.pop(key, None)
+            tracker = self.blink_trackers.get(track_id)
+            if tracker is None:
+                tracker = self.blink_trackers[track_id] = BlinkTracker()
+            return tracker
+    
+    def has_recent_blink(self, track_id):
+        """True if the track blinked within BLINK_VALID_SECONDS (no tracker is created)"""
+        with self._trackers_lock:
+            tracker = self.blink_trackers.get(track_id)
+        return tracker is not None and tracker.recently_blinked()
+    
+    def eyes_closing(self, track_id):
+        """True if the track's newest EAR samples dip below its baseline (a blink may be completing)"""
+        with self._trackers_lock:
+            tracker = self.blink_trackers.get(track_id)
+        return tracker is not None and tracker.closed_run() > 0
+    
+    def get_pose_estimator(self, track_id):
+        """Get (or create) the warm-started head pose estimator for a face track"""
+        with self._trackers_lock:
+            estimator = self.pose_estimators.get(track_id)
+            if estimator is None:
+                estimator = self.pose_estimators[track_id] = HeadPoseEstimator()
+            return estimator
+    
+    def release_tracks(self, session_id):
+        """Drop tracks belonging to a camera session ((session_id, ...) keys)"""
+        with self._trackers_lock:
+            for tracks in (self.blink_trackers, self.landmark_caches, self.pose_estimators):
+                for key in [k for k in tracks
+                            if k == session_id or (isinstance(k, tuple) and k[0] == session_id)]:
+                    del tracks[key]
     
     def calculate_ear(self, eye):
         """Calculate Eye Aspect Ratio for blink detection"""
         try:
-            A = dist.euclidean(eye[1], eye[5])
-            B = dist.euclidean(eye[2], eye[4])
-            C = dist.euclidean(eye[0], eye[3])
-            ear = (A + B) / (2.0 * C + 1e-6)
-            return ear
+            return float(eye_aspect_ratios(eye))
         except Exception as e:
             logger.error(f"Error calculating EAR: {e}")
             return 0.25
@@ -53,64 +321,20 @@ class LivenessDetector:
     def calculate_mar(self, mouth):
         """Calculate Mouth Aspect Ratio"""
         try:
-            A = dist.euclidean(mouth[2], mouth[10])
-            B = dist.euclidean(mouth[4], mouth[8])
-            C = dist.euclidean(mouth[0], mouth[6])
-            mar = (A + B) / (2.0 * C + 1e-6)
-            return mar
+            mouth = np.asarray(mouth, dtype=np.float64)
+            vertical = np.linalg.norm(mouth[[2, 4]] - mouth[[10, 8]], axis=1).sum()
+            horizontal = np.linalg.norm(mouth[0] - mouth[6])
+            return float(vertical / (2.0 * horizontal + 1e-6))
         except Exception as e:
             logger.error(f"Error calculating MAR: {e}")
             return 0.3
     
-    def estimate_head_pose(self, landmarks, frame_shape):
+    def estimate_head_pose(self, landmarks, frame_shape, track_id=None):
         """Estimate head pose to detect if user is looking at camera"""
         try:
-            model_points = np.array([
-                (0.0, 0.0, 0.0),
-                (0.0, -330.0, -65.0),
-                (-225.0, 170.0, -135.0),
-                (225.0, 170.0, -135.0),
-                (-150.0, -150.0, -125.0),
-                (150.0, -150.0, -125.0)
-            ], dtype=np.float64)
-            
-            image_points = np.array([
-                landmarks[30],
-                landmarks[8],
-                landmarks[36],
-                landmarks[45],
-                landmarks[48],
-                landmarks[54]
-            ], dtype=np.float64)
-            
-            size = frame_shape
-            focal_length = size[1]
-            center = (size[1] / 2, size[0] / 2)
-            camera_matrix = np.array([
-                [focal_length, 0, center[0]],
-                [0, focal_length, center[1]],
-                [0, 0, 1]
-            ], dtype=np.float64)
-            
-            dist_coeffs = np.zeros((4, 1))
-            
-            success, rotation_vector, translation_vector = cv2.solvePnP(
-                model_points, image_points, camera_matrix, dist_coeffs,
-                flags=cv2.SOLVEPNP_ITERATIVE
-            )
-            
-            if not success:
-                return 0, 0, 0
-            
-            rotation_mat, _ = cv2.Rodrigues(rotation_vector)
-            pose_mat = cv2.hconcat((rotation_mat, translation_vector))
-            _, _, _, _, _, _, euler_angles = cv2.decomposeProjectionMatrix(pose_mat)
-            
-            pitch = float(euler_angles[0][0])
-            yaw = float(euler_angles[1][0])
-            roll = float(euler_angles[2][0])
-            
-            return pitch, yaw, roll
+            if track_id is None:
+                return HeadPoseEstimator().estimate(landmarks, frame_shape)
+            return self.get_pose_estimator(track_id).estimate(landmarks, frame_shape)
         except Exception as e:
             logger.error(f"Error estimating head pose: {e}")
             return 0, 0, 0
@@ -125,9 +349,60 @@ class LivenessDetector:
             logger.error(f"Error detecting texture: {e}")
             return 0
     
-    def comprehensive_liveness_check(self, frame):
+    def predict_landmarks(self, frame, face_location):
+        """
+        68-point landmarks for a known face box, predicted on a padded ROI only
+        face_location: (top, right, bottom, left) in frame coordinates
+        Returns: (68, 2) int array in frame coordinates
+        """
+        top, right, bottom, left = face_location
+        h, w = frame.shape[:2]
+        pad = max(right - left, bottom - top) // 4
+        x0, y0 = max(0, left - pad), max(0, top - pad)
+        x1, y1 = min(w, right + pad), min(h, bottom + pad)
+        
+        roi_gray = cv2.cvtColor(frame[y0:y1, x0:x1], cv2.COLOR_BGR2GRAY)
+        rect = dlib.rectangle(int(left - x0), int(top - y0), int(right - x0), int(bottom - y0))
+        shape = self.predictor(roi_gray, rect)
+        
+        landmarks_np = np.array([(p.x, p.y) for p in shape.parts()])
+        landmarks_np += (x0, y0)
+        return landmarks_np
+    
+    def get_landmarks(self, frame, face_location, track_id='default', frame_seq=None, allow_stale=False):
+        """
+        Landmarks for a face box through the per-track cache
+        Returns: (landmarks, fresh) - fresh is False when reused from an earlier frame
+        """
+        if not Config.ENABLE_LANDMARK_CACHE:
+            return self.predict_landmarks(frame, face_location), True
+        
+        with self._trackers_lock:
+            cache = self.landmark_caches.get(track_id)
+            if cache is None:
+                cache = self.landmark_caches[track_id] = LandmarkCache(
+                    Config.LANDMARK_CACHE_TIMEOUT, Config.LANDMARK_CACHE_BOX_TOLERANCE
+                )
+        
+        landmarks, same_frame = cache.get(frame_seq, face_location, allow_stale)
+        if landmarks is not None:
+            metrics.inc('attendance_landmark_cache_total', result='hit')
+            return landmarks, same_frame
+        
+        metrics.inc('attendance_landmark_cache_total', result='miss')
+        landmarks = self.predict_landmarks(frame, face_location)
+        cache.put(frame_seq, face_location, landmarks)
+        return landmarks, True
+    
+    def comprehensive_liveness_check(self, frame, face_location=None, landmarks=None, track_id='default',
+                                     frame_seq=None):
         """
         FIXED: More lenient liveness detection
+        face_location: (top, right, bottom, left) of the already recognized face;
+        skips detection and runs the landmark predictor on that ROI only
+        landmarks: optional precomputed (68, 2) landmarks for that face
+        track_id: key of the blink history and landmark cache (one per tracked face)
+        frame_seq: id of the frame, so stages of one frame share landmarks
         Returns: (is_live, confidence, details)
         """
         try:
@@ -141,19 +416,31 @@ class LivenessDetector:
                     'scores': {'blink': 1.0, 'texture': 1.0, 'head_pose': 1.0}
                 }
             
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            faces = self.detector(gray)
+            if face_location is None:
+                # Legacy path: find the face ourselves
+                gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+                faces = self.detector(gray)
+                
+                if len(faces) == 0:
+                    return False, 0.0, {'error': 'No face detected'}
+                
+                face = faces[0]
+                face_location = (face.top(), face.right(), face.bottom(), face.left())
             
-            if len(faces) == 0:
-                return False, 0.0, {'error': 'No face detected'}
+            tracker = self.get_blink_tracker(track_id)
             
-            face = faces[0]
-            landmarks = self.predictor(gray, face)
-            landmarks_np = np.array([(p.x, p.y) for p in landmarks.parts()])
+            fresh = True
+            if landmarks is not None:
+                landmarks_np = np.asarray(landmarks)
+            else:
+                # Once a blink is verified, slightly stale landmarks are fine for pose/texture
+                landmarks_np, fresh = self.get_landmarks(
+                    frame, face_location, track_id, frame_seq, allow_stale=tracker.recently_blinked()
+                )
             
             # Extract face ROI for texture analysis
-            x, y, w, h = face.left(), face.top(), face.width(), face.height()
-            face_roi = frame[y:y+h, x:x+w]
+            top, right, bottom, left = face_location
+            face_roi = frame[max(0, top):bottom, max(0, left):right]
             
             # Initialize scores
             verification_scores = {
@@ -162,31 +449,24 @@ class LivenessDetector:
                 'head_pose': 0
             }
             
-            # 1. BLINK DETECTION (more lenient)
-            left_eye = landmarks_np[42:48]
-            right_eye = landmarks_np[36:42]
-            left_ear = self.calculate_ear(left_eye)
-            right_ear = self.calculate_ear(right_eye)
-            ear = (left_ear + right_ear) / 2.0
+            # 1. BLINK DETECTION (temporal, per track)
+            ear = float(eye_aspect_ratios(np.stack([landmarks_np[LEFT_EYE], landmarks_np[RIGHT_EYE]])).mean())
             
-            # Track blink more generously
-            if ear < self.EAR_THRESHOLD:
-                self.eyes_closed_frames += 1
-                self.blink_in_progress = True
-            else:
-                if self.blink_in_progress and self.eyes_closed_frames >= 1:  # Just 1 frame needed
-                    self.total_blinks += 1
-                    verification_scores['blink'] = 1.0
-                    logger.info(f"✓ Blink detected! Total blinks: {self.total_blinks}")
-                self.eyes_closed_frames = 0
-                self.blink_in_progress = False
+            # Reused landmarks would repeat an old EAR sample
+            if fresh and tracker.add(ear):
+                self.total_blinks += 1
+                hot_logger.info("✓ Blink detected! Track blinks: %d", tracker.blinks)
             
-            # Give partial credit for closed eyes
-            if ear < self.EAR_THRESHOLD:
+            # Only a confirmed open -> closed -> open blink passes the blink gate;
+            # eyes staying shut across fresh samples get partial credit only
+            if tracker.recently_blinked():
+                verification_scores['blink'] = 1.0
+            elif (fresh and ear < self.EAR_THRESHOLD
+                  and tracker.closed_run() >= Config.BLINK_MIN_CLOSED_SAMPLES):
                 verification_scores['blink'] = 0.5
             
             # 2. HEAD POSE (very lenient)
-            pitch, yaw, roll = self.estimate_head_pose(landmarks_np, frame.shape)
+            pitch, yaw, roll = self.estimate_head_pose(landmarks_np, frame.shape, track_id)
             
             if abs(pitch) < self.HEAD_POSE_THRESHOLD and abs(yaw) < self.HEAD_POSE_THRESHOLD:
                 verification_scores['head_pose'] = 1.0
@@ -222,31 +502,34 @@ class LivenessDetector:
             is_live = confidence >= 0.5  # Was 0.7, now 0.5
             
             details = {
-                'blink_detected': blink_score >= 0.5,
+                'blink_detected': blink_score >= 1.0,
                 'head_pose_correct': head_pose_score > 0,
                 'texture_valid': texture_score > 0,
-                'total_blinks': self.total_blinks,
+                'total_blinks': tracker.blinks,
                 'ear': ear,
                 'head_angles': {'pitch': pitch, 'yaw': yaw, 'roll': roll},
                 'texture_quality': texture_quality,
                 'scores': verification_scores
             }
             
-            logger.info(f"Liveness: conf={confidence:.2f}, texture={texture_score:.2f}, "
-                       f"head={head_pose_score:.2f}, blink={blink_score:.2f}")
+            hot_logger.info("Liveness: conf=%.2f, texture=%.2f, head=%.2f, blink=%.2f",
+                            confidence, texture_score, head_pose_score, blink_score)
             
             return is_live, confidence, details
             
         except Exception as e:
-            logger.error(f"Error in liveness detection: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("Error in liveness detection: %s", e)
             # FIXED: Fail-open on error
             return True, 0.5, {'error': str(e), 'fail_open': True}
     
-    def quick_blink_check(self, frame):
-        """Fast blink detection"""
+    def quick_blink_check(self, frame, face_location=None, track_id='default', frame_seq=None):
+        """Fast blink detection (shares cached landmarks when the face box is known)"""
         try:
+            if face_location is not None:
+                landmarks_np, _ = self.get_landmarks(frame, face_location, track_id, frame_seq)
+                ear = float(eye_aspect_ratios(np.stack([landmarks_np[LEFT_EYE], landmarks_np[RIGHT_EYE]])).mean())
+                return ear < self.EAR_THRESHOLD
+            
             gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
             faces = self.detector(gray)
             
@@ -254,12 +537,7 @@ class LivenessDetector:
                 landmarks = self.predictor(gray, face)
                 landmarks_np = np.array([(p.x, p.y) for p in landmarks.parts()])
                 
-                left_eye = landmarks_np[42:48]
-                right_eye = landmarks_np[36:42]
-                
-                left_ear = self.calculate_ear(left_eye)
-                right_ear = self.calculate_ear(right_eye)
-                ear = (left_ear + right_ear) / 2.0
+                ear = float(eye_aspect_ratios(np.stack([landmarks_np[LEFT_EYE], landmarks_np[RIGHT_EYE]])).mean())
                 
                 if ear < self.EAR_THRESHOLD:
                     return True
@@ -276,5 +554,7 @@ class LivenessDetector:
         self.total_blinks = 0
         self.frame_check_counter = 0
         self.verification_history = []
-        self.eyes_closed_frames = 0
-        self.blink_in_progress = False
\ No newline at end of file
+        with self._trackers_lock:
+            self.blink_trackers = {}
+            self.landmark_caches = {}
+            self.pose_estimators = {}
\ No newline at end of file
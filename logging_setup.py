@@ -0,0 +1,148 @@
+# logging_setup.py - Queue-based, structured logging configured once per process
+"""
+Non-blocking logging for the server.
+
+configure_logging() installs a single QueueHandler on the root logger; a
+QueueListener thread does the formatting and stream I/O, so a log call on
+the frame path costs a dict copy and a put_nowait. Exceptions logged with
+logger.exception() are formatted by the listener thread as well.
+
+Per-frame messages go through hot-path loggers (get_hot_path_logger). These:
+- are level-gated by LOG_HOT_PATH_LEVEL (a disabled call is a single
+  isEnabledFor check),
+- are sampled per frame: begin_frame() decides once per frame whether
+  that frame's INFO/DEBUG hot-path records are emitted. Warnings and errors
+  always pass. Work handed to executor threads carries the decision along
+  (frame_sampled() at submit, begin_frame(sampled) in the worker).
+"""
+import atexit
+import copy
+import itertools
+import json
+import logging
+import logging.handlers
+import queue
+import threading
+from datetime import datetime, timezone
+
+from config import Config
+
+HOT_PATH_PREFIX = 'hotpath.'
+
+# Attributes every LogRecord has; anything else came from extra={...}
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+_configure_lock = threading.Lock()
+_listener = None
+_handler = None
+_frame_state = threading.local()
+_frame_counter = itertools.count()
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line"""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name[len(HOT_PATH_PREFIX):] if record.name.startswith(HOT_PATH_PREFIX) else record.name,
+            'msg': record.getMessage(),
+            'thread': record.threadName
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops (and counts) records instead of blocking when full"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Resolve the message now (args may be mutated later) but leave
+        # exc_info for the listener to format off the calling thread
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class HotPathSampler(logging.Filter):
+    """Pass INFO/DEBUG hot-path records only for frames chosen by begin_frame()"""
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or not record.name.startswith(HOT_PATH_PREFIX):
+            return True
+        return frame_sampled()
+
+
+def begin_frame(sampled=None):
+    """
+    Decide once per frame whether its hot-path records are emitted
+    sampled: a decision already made for this frame, for work handed to
+    another thread (see frame_sampled())
+    """
+    if sampled is None:
+        every = Config.LOG_HOT_PATH_SAMPLE_EVERY
+        sampled = every <= 1 or next(_frame_counter) % every == 0
+    _frame_state.sampled = sampled
+    return sampled
+
+
+def frame_sampled():
+    """The current thread's sampling decision, to pass along with frame work"""
+    return getattr(_frame_state, 'sampled', True)
+
+
+def get_hot_path_logger(name):
+    """Logger for per-frame messages (sampled and separately level-gated)"""
+    return logging.getLogger(HOT_PATH_PREFIX + name)
+
+
+def dropped_records():
+    return _handler.dropped if _handler is not None else 0
+
+
+def configure_logging(level=None, json_format=None):
+    """Install the queue handler and listener; later calls are no-ops"""
+    global _listener, _handler
+
+    with _configure_lock:
+        if _listener is not None:
+            return
+
+        if json_format is None:
+            json_format = Config.LOG_JSON
+
+        stream = logging.StreamHandler()
+        if json_format:
+            stream.setFormatter(JsonFormatter())
+        else:
+            stream.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+
+        _handler = NonBlockingQueueHandler(queue.Queue(maxsize=Config.LOG_QUEUE_SIZE))
+        _handler.addFilter(HotPathSampler())
+
+        root = logging.getLogger()
+        for existing in list(root.handlers):
+            root.removeHandler(existing)
+        root.addHandler(_handler)
+        root.setLevel(level or Config.LOG_LEVEL)
+        logging.getLogger(HOT_PATH_PREFIX.rstrip('.')).setLevel(Config.LOG_HOT_PATH_LEVEL)
+
+        _listener = logging.handlers.QueueListener(_handler.queue, stream, respect_handler_level=True)
+        _listener.start()
+        atexit.register(_listener.stop)
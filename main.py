@@ -1,13 +1,25 @@
 # Complete main Flask application - working version with spoof detection
-from flask import Flask, redirect, url_for
+from flask import Flask, redirect, url_for, request, Response
 from flask_socketio import SocketIO, emit
 from flask_cors import CORS
-from models import db, AbsenceTracker, ActivityLog
-from routes import api
+from logging_setup import configure_logging, begin_frame, dropped_records
+
+# Configure logging before the service modules below log at import time
+configure_logging()
+
+from models import db, AbsenceTracker, ActivityLog, Student
+from routes import api, face_service as enrollment_face_service, save_enrollment
 from auth_routes import auth_bp
 from student_routes import student_bp
 from config import Config
 from auth_service import User
+from frame_gate import compute_frame_hash, downsample_gray, GATE_WIDTH, GATE_HEIGHT
+from enrollment_quality import quality_assessor
+from enrollment_session import EnrollmentSession
+from pipeline_metrics import stage_timer, count_state, registry as metrics_registry
+from sampling_profiler import profiler
+from activity_log_writer import activity_log_writer
+from event_aggregator import event_aggregator
 import cv2
 import threading
 import time
@@ -18,10 +30,6 @@ import pytz
 from datetime import datetime
 from apscheduler.schedulers.background import BackgroundScheduler
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
 logger = logging.getLogger(__name__)
 
 IST = pytz.timezone(Config.TIMEZONE)
@@ -42,9 +50,21 @@ def create_app():
     def index():
         return redirect(url_for('auth.login_page'))
     
+    @app.route('/metrics')
+    def metrics():
+        """Pipeline metrics in Prometheus text format"""
+        return Response(metrics_registry.render(), mimetype='text/plain; version=0.0.4')
+    
     return app
 
+metrics_registry.counter_func(
+    'attendance_log_records_dropped_total',
+    dropped_records,
+    'Log records dropped because the logging queue was full'
+)
+
 app = create_app()
+activity_log_writer.start(app)
 socketio = SocketIO(
     app, 
     cors_allowed_origins="*",
@@ -54,6 +74,18 @@ socketio = SocketIO(
     async_mode='threading'
 )
 
+def decode_frame(frame_data):
+    """Decode a base64 JPEG frame; returns None if it is not a valid image"""
+    frame_bytes = base64.b64decode(frame_data)
+    nparr = np.frombuffer(frame_bytes, np.uint8)
+    return cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+
+def broadcast_event_summary(summary):
+    """Send an aggregated event window (opened or closed) to all dashboards"""
+    socketio.emit('event_summary', summary, namespace='/')
+
+event_aggregator.on_summary = broadcast_event_summary
+
 def broadcast_spoof_event(event_data):
     """
     Broadcast spoof detection event to all connected clients
@@ -70,7 +102,6 @@ class EnhancedCameraService:
         self.is_running = False
         self.last_recognition_time = {}
         self.recognition_cooldown = 5
-        self.last_event_log_time = {}
         
         from face_recognition_service import FaceRecognitionService
         from attendance_service import AttendanceService
@@ -93,6 +124,11 @@ class EnhancedCameraService:
                 logger.info(f"Face encodings loaded: {len(self.face_service.known_ids)} students")
             except Exception as e:
                 logger.error(f"Failed to load face encodings: {e}")
+            
+            try:
+                self.attendance_service.load_marked_today()
+            except Exception as e:
+                logger.error(f"Failed to load today's attendance: {e}")
         
         logger.info("Enhanced camera service started with intelligent state management")
 
@@ -102,28 +138,40 @@ class EnhancedCameraService:
         self.last_recognition_time = {}
         logger.info("Camera service stopped")
 
-    def process_frame(self, frame_data):
+    def release_session(self, session_id):
+        """Drop per-session caches for a disconnected camera"""
+        self.face_service.release_session(session_id)
+
+    def process_frame(self, frame_data, session_id=None):
         """Process frame with intelligent state-based notifications and spoof detection"""
         if not self.is_running:
             return {'status': 'system_stopped'}
         
+        begin_frame()
+        
         try:
             # Decode frame
-            frame_bytes = base64.b64decode(frame_data)
-            nparr = np.frombuffer(frame_bytes, np.uint8)
-            frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+            with stage_timer('decode'):
+                frame = decode_frame(frame_data)
             
             if frame is None:
                 return {'status': 'invalid_frame'}
             
+            # Tiny gray thumbnail shared by the motion gate and the frame hash
+            small_gray = downsample_gray(frame, (GATE_WIDTH, GATE_HEIGHT))
+            frame_hash = compute_frame_hash(small_gray) if Config.ENABLE_FRAME_HASH_CACHE else None
+            
             # Use enhanced recognition with state management
-            status, message, data = self.face_service.recognize_faces_with_state(frame)
+            status, message, data = self.face_service.recognize_faces_with_state(
+                frame, session_id=session_id, frame_hash=frame_hash, small_gray=small_gray
+            )
+            count_state(status, session_id)
             
             current_time = time.time()
             
             # Handle different states
             if status == 'obstructed':
-                self._log_recent_event('camera_obstructed', message)
+                # Dashboards get aggregated obstruction windows via event_summary
                 return {
                     'status': 'obstructed',
                     'message': message
@@ -151,6 +199,12 @@ class EnhancedCameraService:
                     'student_name': data.get('student_name')
                 }
             
+            if status == 'already_marked':
+                return {
+                    'status': 'already_marked',
+                    'message': message
+                }
+            
             if status in ['verifying_gaze', 'verifying_blink', 'verifying']:
                 return {
                     'status': 'verifying',
@@ -237,27 +291,9 @@ class EnhancedCameraService:
             return {'status': 'processing'}
         
         except Exception as e:
-            logger.error(f"Error processing frame: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("Error processing frame: %s", e)
             return {'status': 'error', 'message': str(e)}
 
-    def _log_recent_event(self, event_type, message):
-        """Log events to Recent Events"""
-        current_time = time.time()
-        
-        if event_type in self.last_event_log_time:
-            if current_time - self.last_event_log_time[event_type] < 10:
-                return
-        
-        self.last_event_log_time[event_type] = current_time
-        
-        socketio.emit('recent_event', {
-            'type': event_type,
-            'message': message,
-            'timestamp': current_time
-        })
-
 camera_service = EnhancedCameraService()
 
 # SocketIO Handlers
@@ -291,7 +327,8 @@ def handle_process_frame(data):
         if not frame_data:
             return
         
-        result = camera_service.process_frame(frame_data)
+        with profiler.frame_scope(request.sid):
+            result = camera_service.process_frame(frame_data, session_id=request.sid)
         
         if result['status'] == 'attendance_marked':
             for attendance_result in result['results']:
@@ -303,6 +340,120 @@ def handle_process_frame(data):
     except Exception as e:
         logger.error(f"Error handling frame: {e}")
 
+# Streaming enrollment sessions, keyed by Socket.IO sid
+enrollment_sessions = {}
+
+@socketio.on('enroll_start')
+def handle_enroll_start(data):
+    """Open a streaming enrollment session (admin only)"""
+    try:
+        payload = User.verify_token((data or {}).get('token'))
+        with app.app_context():
+            user = User.query.get(payload['user_id']) if payload else None
+            if not user or not user.is_active or user.role != 'admin':
+                emit('enroll_error', {'message': 'Admin access required'})
+                return
+            user_id = user.id
+        
+        enrollment_sessions[request.sid] = EnrollmentSession(user_id, Config.ENROLL_STREAM_BUFFER_SIZE)
+        emit('enroll_ready', {
+            'buffer_size': Config.ENROLL_STREAM_BUFFER_SIZE,
+            'min_frames': Config.ENROLL_STREAM_MIN_FRAMES
+        })
+    except Exception as e:
+        logger.error(f"Error starting enrollment session: {e}")
+        emit('enroll_error', {'message': str(e)})
+
+@socketio.on('enroll_frame')
+def handle_enroll_frame(data):
+    """Score a streamed preview frame and buffer it if it is among the best"""
+    session = enrollment_sessions.get(request.sid)
+    if session is None:
+        emit('enroll_error', {'message': 'No active enrollment session'})
+        return
+    
+    try:
+        frame_data = (data or {}).get('frame')
+        frame = decode_frame(frame_data) if frame_data else None
+        if frame is None:
+            emit('enroll_quality', {
+                'success': False,
+                'has_face': False,
+                'buffered': session.buffered,
+                'feedback': {'status': 'poor', 'message': 'Invalid frame data', 'items': []}
+            })
+            return
+        
+        result = quality_assessor.assess(frame, request.sid)
+        
+        if (data.get('capture') and result.get('has_face') and not result.get('stale')
+                and result.get('quality_score', 0) >= Config.ENROLL_STREAM_MIN_SCORE):
+            session.offer(frame, result['quality_score'])
+        
+        result['buffered'] = session.buffered
+        emit('enroll_quality', result)
+    except Exception as e:
+        logger.error(f"Error handling enrollment frame: {e}")
+        emit('enroll_error', {'message': str(e)})
+
+@socketio.on('enroll_commit')
+def handle_enroll_commit(data):
+    """Encode from the buffered best frames and store the enrollment"""
+    session = enrollment_sessions.get(request.sid)
+    if session is None:
+        emit('enroll_result', {'success': False, 'message': 'No active enrollment session'})
+        return
+    
+    frames = session.best_frames()
+    if len(frames) < Config.ENROLL_STREAM_MIN_FRAMES:
+        emit('enroll_result', {
+            'success': False,
+            'message': f'At least {Config.ENROLL_STREAM_MIN_FRAMES} good frames required (captured {len(frames)})'
+        })
+        return
+    
+    student_id_str = (data or {}).get('student_id')
+    
+    with app.app_context():
+        try:
+            student = Student.query.filter_by(student_id=student_id_str).first()
+            if not student:
+                emit('enroll_result', {'success': False, 'message': f'Student ID {student_id_str} not found'})
+                return
+            
+            # Best-scoring buffered frame is encoded (same rules as multi-shot upload)
+            _, best_frame = frames[0]
+            success, message, face_encoding = enrollment_face_service.enroll_student(best_frame, student)
+            if not success:
+                emit('enroll_result', {'success': False, 'message': message})
+                return
+            
+            save_enrollment(student, best_frame, face_encoding)
+            student_name = student.name
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Streaming enrollment error: {e}")
+            emit('enroll_result', {'success': False, 'message': f'Enrollment failed: {str(e)}'})
+            return
+    
+    enrollment_sessions.pop(request.sid, None)
+    logger.info(f"✓ Streaming enrollment successful for {student_name} ({len(frames)} buffered frames)")
+    emit('enroll_result', {
+        'success': True,
+        'message': f'Student {student_name} enrolled successfully with {len(frames)} frames'
+    })
+
+@socketio.on('enroll_cancel')
+def handle_enroll_cancel():
+    """Discard the enrollment buffer"""
+    enrollment_sessions.pop(request.sid, None)
+
+@socketio.on('disconnect')
+def handle_disconnect():
+    """Release per-session state when a kiosk disconnects"""
+    camera_service.release_session(request.sid)
+    enrollment_sessions.pop(request.sid, None)
+
 # Scheduler for daily tasks
 def setup_scheduler():
     """Setup daily attendance reset scheduler"""
@@ -316,6 +467,14 @@ def setup_scheduler():
         id='daily_attendance_check'
     )
     
+    # Close aggregated event windows even when no further events arrive
+    scheduler.add_job(
+        func=event_aggregator.sweep,
+        trigger='interval',
+        seconds=max(1, Config.EVENT_AGGREGATION_WINDOW_SECONDS // 6),
+        id='event_aggregator_sweep'
+    )
+    
     scheduler.start()
     logger.info(f"Scheduler started - Daily check at {Config.RESET_TIME_HOUR:02d}:{Config.RESET_TIME_MINUTE:02d} IST")
 
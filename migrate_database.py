@@ -59,6 +59,15 @@ def migrate_database():
                     conn.commit()
                 logger.info("✓ Spoof detection columns added to activity_logs")
             
+            if 'event_count' not in activity_columns:
+                logger.info("Adding event aggregation columns to activity_logs...")
+                with db.engine.connect() as conn:
+                    conn.execute(text('ALTER TABLE activity_logs ADD COLUMN event_count INTEGER DEFAULT 1'))
+                    conn.execute(text('ALTER TABLE activity_logs ADD COLUMN first_seen DATETIME'))
+                    conn.execute(text('ALTER TABLE activity_logs ADD COLUMN last_seen DATETIME'))
+                    conn.commit()
+                logger.info("✓ Event aggregation columns added to activity_logs")
+            
             # Ensure parent_phone is not null (for existing records, set a default)
             logger.info("Checking parent_phone constraints...")
             with db.engine.connect() as conn:
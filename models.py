@@ -50,6 +50,10 @@ class ActivityLog(db.Model):
     spoof_type = db.Column(db.String(100), nullable=True)
     spoof_confidence = db.Column(db.Float, nullable=True)
     detection_details = db.Column(db.Text, nullable=True)
+    # Aggregated events: occurrences collapsed into this row
+    event_count = db.Column(db.Integer, default=1)
+    first_seen = db.Column(db.DateTime, nullable=True)
+    last_seen = db.Column(db.DateTime, nullable=True)
 
 class Alert(db.Model):
     id = db.Column(db.Integer, primary_key=True)
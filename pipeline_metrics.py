@@ -0,0 +1,185 @@
+# pipeline_metrics.py - Low-overhead per-stage timers and outcome counters
+"""
+In-process metrics for the recognition pipeline, exported in the
+Prometheus text format.
+
+Usage:
+    with stage_timer('detection'):
+        ...
+    count_state('verified', session_id)
+
+Histograms use fixed buckets so recording is a lock plus a few integer
+increments; no samples are kept unless record_samples is enabled
+(used by the offline benchmark for exact percentiles).
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds; tuned for CPU-only frame stages (sub-ms up to multi-second)
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+PIPELINE_STAGES = (
+    'decode', 'obstruction', 'detection', 'encoding', 'matching',
+    'liveness', 'spoof_texture', 'yolo', 'cnn', 'moire', 'db_write'
+)
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.total += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}  # (name, labels) -> Histogram
+        self._counters = {}    # (name, labels) -> int
+        self._gauges = {}      # name -> callable returning a number
+        self._counter_funcs = {}  # name -> callable returning a monotonic total
+        self._help = {}
+        self._buckets = {}     # name -> buckets, for histograms not measured in seconds
+        self.record_samples = False
+        self.samples = {}      # stage -> [seconds], only when record_samples
+
+    def describe(self, name, help_text, buckets=None):
+        self._help[name] = help_text
+        if buckets is not None:
+            self._buckets[name] = buckets
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(self._buckets.get(name, DEFAULT_BUCKETS))
+            histogram.observe(value)
+            if self.record_samples:
+                self.samples.setdefault(labels.get('stage', name), []).append(value)
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def gauge(self, name, func, help_text=None):
+        """Register a callable evaluated at scrape time"""
+        self._gauges[name] = func
+        if help_text:
+            self._help[name] = help_text
+
+    def counter_func(self, name, func, help_text=None):
+        """Register a callable returning a monotonic total kept elsewhere (exported as a counter)"""
+        self._counter_funcs[name] = func
+        if help_text:
+            self._help[name] = help_text
+
+    def counter_value(self, name, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            return self._counters.get(key, 0)
+
+    def forget(self, label, value):
+        """Drop every series carrying label=value (e.g. a closed session)"""
+        with self._lock:
+            for store in (self._histograms, self._counters):
+                for key in [k for k in store if (label, value) in k[1]]:
+                    del store[key]
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+            self.samples = {}
+
+    def render(self):
+        """Prometheus text exposition format (version 0.0.4)"""
+        with self._lock:
+            histograms = [(k, list(h.counts), h.total, h.count, h.buckets) for k, h in self._histograms.items()]
+            counters = list(self._counters.items())
+
+        lines = []
+        typed = set()
+
+        def header(name, kind):
+            if name in typed:
+                return
+            typed.add(name)
+            if name in self._help:
+                lines.append(f"# HELP {name} {self._help[name]}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), counts, total, count, buckets in sorted(histograms, key=lambda h: h[0]):
+            header(name, 'histogram')
+            cumulative = 0
+            for bound, bucket_count in zip(buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{name}_bucket{_labels(labels, le=_format(bound))} {cumulative}")
+            lines.append(f"{name}_bucket{_labels(labels, le='+Inf')} {count}")
+            lines.append(f"{name}_sum{_labels(labels)} {total:.6f}")
+            lines.append(f"{name}_count{_labels(labels)} {count}")
+
+        for (name, labels), value in sorted(counters):
+            header(name, 'counter')
+            lines.append(f"{name}{_labels(labels)} {value}")
+
+        for kind, funcs in (('counter', self._counter_funcs), ('gauge', self._gauges)):
+            for name, func in sorted(funcs.items()):
+                try:
+                    value = func()
+                except Exception:
+                    continue
+                header(name, kind)
+                lines.append(f"{name} {value}")
+
+        return "\n".join(lines) + "\n"
+
+
+def _format(value):
+    return repr(float(value))
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels, **extra):
+    items = list(labels) + list(extra.items())
+    if not items:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in items) + '}'
+
+
+registry = MetricsRegistry()
+registry.describe('attendance_stage_seconds', 'Time spent in each recognition pipeline stage')
+registry.describe('attendance_state_total', 'Recognition state outcomes per camera session')
+registry.describe('attendance_frame_cache_total', 'Duplicate-frame detection cache lookups')
+registry.describe('attendance_motion_gate_skips_total', 'Frames skipped by the idle motion gate')
+registry.describe('attendance_unknown_cache_total', 'Unknown-face negative cache lookups')
+registry.describe('attendance_landmark_cache_total', 'Facial landmark cache lookups')
+
+
+@contextmanager
+def stage_timer(stage):
+    """Time a pipeline stage into attendance_stage_seconds{stage=...}"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        registry.observe('attendance_stage_seconds', time.perf_counter() - start, stage=stage)
+
+
+def count_state(state, session_id=None):
+    """Count a recognition state outcome for a camera session"""
+    registry.inc('attendance_state_total', state=state, session=session_id or 'default')
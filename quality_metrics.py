@@ -0,0 +1,169 @@
+# quality_metrics.py - Shared image quality metrics for obstruction, face quality and enrollment feedback
+"""
+Single-pass quality metrics.
+
+The frame is converted to a downsampled float32 gray image once; brightness,
+contrast and sharpness (Laplacian variance) for the whole frame and for any
+face region are all read from the same two buffers. All thresholds live in
+Config (or in the scoring bands below) so the kiosk, enrollment and the
+quality preview can no longer drift apart.
+
+Note: sharpness is measured at the working resolution (QUALITY_METRICS_MAX_SIDE),
+not at the camera's native resolution.
+"""
+import cv2
+import numpy as np
+from config import Config
+
+# Enrollment preview scoring bands: (full score range, half score range)
+BRIGHTNESS_GOOD = (50, 200)
+BRIGHTNESS_FAIR = (30, 240)
+SHARPNESS_GOOD = 100
+SHARPNESS_FAIR = 50
+FACE_SIZE_GOOD = 150
+FACE_SIZE_FAIR = 100
+
+
+def _mean_std_var(gray, laplacian):
+    """Brightness, contrast and sharpness of matching gray/Laplacian buffers"""
+    mean, std = cv2.meanStdDev(gray)
+    _, lap_std = cv2.meanStdDev(laplacian)
+    return {
+        'brightness': float(mean[0][0]),
+        'contrast': float(std[0][0]),
+        'sharpness': float(lap_std[0][0]) ** 2
+    }
+
+
+class FrameMetrics:
+    """Quality metrics of one frame, plus access to face-region metrics"""
+
+    def __init__(self, gray, laplacian, scale, frame_shape):
+        self.gray = gray
+        self.laplacian = laplacian
+        self.scale = scale
+        self.frame_shape = frame_shape
+
+        values = _mean_std_var(gray, laplacian)
+        self.brightness = values['brightness']
+        self.contrast = values['contrast']
+        self.sharpness = values['sharpness']
+
+    def roi(self, face_location):
+        """
+        Metrics of a face region given in original frame coordinates
+        (top, right, bottom, left). Returns None for an empty region.
+        """
+        top, right, bottom, left = face_location
+        s = self.scale
+        h, w = self.gray.shape[:2]
+
+        y1 = max(0, int(top * s))
+        y2 = min(h, int(round(bottom * s)))
+        x1 = max(0, int(left * s))
+        x2 = min(w, int(round(right * s)))
+
+        if y2 - y1 < 2 or x2 - x1 < 2:
+            return None
+
+        return _mean_std_var(self.gray[y1:y2, x1:x2], self.laplacian[y1:y2, x1:x2])
+
+
+def compute_frame_metrics(frame, max_side=None):
+    """Downsample once to float32 gray and compute whole-frame metrics"""
+    max_side = max_side or Config.QUALITY_METRICS_MAX_SIDE
+    h, w = frame.shape[:2]
+    scale = min(1.0, max_side / float(max(h, w)))
+
+    if frame.ndim == 3:
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    else:
+        gray = frame
+
+    if scale < 1.0:
+        gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+    gray = gray.astype(np.float32)
+    laplacian = cv2.Laplacian(gray, cv2.CV_32F)
+
+    return FrameMetrics(gray, laplacian, scale, frame.shape)
+
+
+def check_obstruction(metrics):
+    """Returns (is_obstructed, reason) from whole-frame metrics"""
+    if metrics.brightness < Config.OBSTRUCTION_MIN_BRIGHTNESS:
+        return True, "Camera covered or very dark"
+
+    if metrics.sharpness < Config.OBSTRUCTION_MIN_SHARPNESS:
+        return True, "Camera shows uniform surface"
+
+    return False, ""
+
+
+def check_face_quality(metrics, face_location, min_face_size):
+    """Returns (is_valid, message) for a detected face"""
+    top, right, bottom, left = face_location
+
+    face_width = right - left
+    face_height = bottom - top
+    if face_width < min_face_size or face_height < min_face_size:
+        return False, "Face too small - move closer"
+
+    h, w = metrics.frame_shape[:2]
+    if left < 0 or top < 0 or right > w or bottom > h:
+        return False, "Face partially outside frame"
+
+    face = metrics.roi(face_location)
+    if face is None:
+        return False, "Invalid face region"
+
+    if face['brightness'] < Config.MIN_FACE_BRIGHTNESS:
+        return False, "Face too dark"
+    if face['brightness'] > Config.MAX_FACE_BRIGHTNESS:
+        return False, "Face overexposed"
+
+    if face['sharpness'] < Config.MIN_IMAGE_SHARPNESS:
+        return False, "Image blurry - hold steady"
+
+    return True, "OK"
+
+
+def score_face_quality(metrics, face_location):
+    """
+    Graded quality breakdown used by the enrollment preview
+    Returns: (quality_score, items)
+    """
+    top, right, bottom, left = face_location
+    face = metrics.roi(face_location) or {'brightness': 0.0, 'sharpness': 0.0}
+
+    brightness = face['brightness']
+    if BRIGHTNESS_GOOD[0] <= brightness <= BRIGHTNESS_GOOD[1]:
+        brightness_score = 1.0
+    elif BRIGHTNESS_FAIR[0] <= brightness <= BRIGHTNESS_FAIR[1]:
+        brightness_score = 0.5
+    else:
+        brightness_score = 0.0
+    brightness_feedback = "Good lighting" if brightness_score >= 0.7 else "Improve lighting"
+
+    sharpness = face['sharpness']
+    sharpness_score = 1.0 if sharpness >= SHARPNESS_GOOD else (0.5 if sharpness >= SHARPNESS_FAIR else 0.0)
+    sharpness_feedback = "Image is sharp" if sharpness_score >= 0.7 else "Hold camera steady"
+
+    face_width = right - left
+    face_height = bottom - top
+    if face_width >= FACE_SIZE_GOOD and face_height >= FACE_SIZE_GOOD:
+        size_score = 1.0
+    elif face_width >= FACE_SIZE_FAIR:
+        size_score = 0.5
+    else:
+        size_score = 0.0
+    size_feedback = "Face size good" if size_score >= 0.7 else "Move closer to camera"
+
+    quality_score = (brightness_score + sharpness_score + size_score) / 3
+
+    items = [
+        {'check': 'Lighting', 'score': brightness_score, 'feedback': brightness_feedback},
+        {'check': 'Sharpness', 'score': sharpness_score, 'feedback': sharpness_feedback},
+        {'check': 'Face Size', 'score': size_score, 'feedback': size_feedback}
+    ]
+    return quality_score, items
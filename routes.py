@@ -1,5 +1,5 @@
 # Enhanced Flask API routes with quality assessment endpoint
-from flask import Blueprint, request, jsonify, render_template
+from flask import Blueprint, request, jsonify, render_template, Response
 from datetime import datetime, date
 import pytz
 from models import db, Student, Attendance, Alert, ActivityLog, get_ist_now, CoordinatorScope
@@ -22,9 +22,9 @@ from student_routes import calculate_attendance_streak
 from whatsapp_service import WhatsAppService
 from sqlalchemy import func, distinct
 from config import Config
+from enrollment_quality import quality_assessor
+from sampling_profiler import profiler, ProfilerBusy
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 api = Blueprint('api', __name__)
@@ -67,6 +67,21 @@ def validate_student_id(student_id):
         return False, "Student ID must be at least 3 characters"
     return True, ""
 
+def save_enrollment(student, frame, face_encoding):
+    """Persist an enrolled face and refresh the in-memory gallery"""
+    student.face_encoding = face_encoding
+    student.face_hash = face_service.compute_face_hash(face_encoding)
+    
+    enroll_dir = os.path.join('static', 'enrollments')
+    ensure_dir(enroll_dir)
+    
+    image_path = os.path.join(enroll_dir, f"student_{student.student_id}.jpg")
+    cv2.imwrite(image_path, frame)
+    student.image_path = image_path
+    
+    db.session.commit()
+    face_service.load_encodings_from_db()
+
 # ============================================
 # HTML ROUTES (NO TOKEN REQUIRED)
 # ============================================
@@ -466,12 +481,58 @@ def activity_logs(current_user):
             'activity_type': l.activity_type,
             'message': l.message,
             'severity': l.severity,
-            'timestamp': l.timestamp.astimezone(IST).isoformat()
+            'timestamp': l.timestamp.astimezone(IST).isoformat(),
+            'event_count': l.event_count or 1,
+            'first_seen': l.first_seen.astimezone(IST).isoformat() if l.first_seen else None,
+            'last_seen': l.last_seen.astimezone(IST).isoformat() if l.last_seen else None
         } for l in logs])
     except Exception as e:
         logger.error(f"Error fetching activity logs: {e}")
         return jsonify([])
 
+@api.route('/api/admin/profile')
+@admin_required
+def profile_frames(current_user):
+    """Sample frame-processing threads for a few seconds (admin only)"""
+    try:
+        seconds = min(float(request.args.get('seconds', 10)), Config.PROFILER_MAX_SECONDS)
+        interval_ms = max(float(request.args.get('interval_ms', Config.PROFILER_DEFAULT_INTERVAL_MS)), 1.0)
+    except ValueError:
+        return jsonify({'success': False, 'message': 'seconds and interval_ms must be numbers'}), 400
+    
+    if seconds <= 0:
+        return jsonify({'success': False, 'message': 'seconds must be positive'}), 400
+    
+    session_id = request.args.get('session') or None
+    include_workers = request.args.get('workers', '').lower() in ('1', 'true', 'yes')
+    
+    try:
+        logger.info(f"Profiling frame threads for {seconds}s (session={session_id}, workers={include_workers}) "
+                    f"by {current_user.username}")
+        result = profiler.profile(
+            seconds,
+            interval_ms / 1000.0,
+            session_id=session_id,
+            max_overhead=Config.PROFILER_MAX_OVERHEAD,
+            include_workers=include_workers
+        )
+    except ProfilerBusy:
+        return jsonify({'success': False, 'message': 'A profile is already running'}), 409
+    
+    if request.args.get('format') == 'json':
+        return jsonify(dict(result.to_dict(), success=True))
+    
+    filename = f"frames-{datetime.now(IST).strftime('%Y%m%d-%H%M%S')}.collapsed"
+    return Response(
+        result.collapsed(),
+        mimetype='text/plain',
+        headers={
+            'Content-Disposition': f'attachment; filename={filename}',
+            'X-Profile-Samples': str(result.samples),
+            'X-Profile-Overhead': f"{result.overhead:.4f}"
+        }
+    )
+
 # ============================================
 # NEW: QUALITY ASSESSMENT ENDPOINT
 # ============================================
@@ -505,85 +566,9 @@ def assess_quality(current_user):
                 }
             }), 200
         
-        # Use face service's quality validation
-        import face_recognition
-        face_locations = face_recognition.face_locations(frame)
-        
-        if len(face_locations) == 0:
-            return jsonify({
-                'success': True,
-                'has_face': False,
-                'feedback': {
-                    'status': 'poor',
-                    'message': 'No face detected - position yourself in frame',
-                    'items': []
-                }
-            }), 200
-        
-        if len(face_locations) > 1:
-            return jsonify({
-                'success': True,
-                'has_face': False,
-                'feedback': {
-                    'status': 'poor',
-                    'message': 'Multiple faces detected - only one person allowed',
-                    'items': []
-                }
-            }), 200
-        
-        # Check quality
-        face_location = face_locations[0]
-        quality_valid, quality_msg = face_service.validate_face_quality(frame, face_location)
-        
-        # Calculate quality score and breakdown
-        top, right, bottom, left = face_location
-        face_roi = frame[top:bottom, left:right]
-        
-        # Brightness check
-        gray = cv2.cvtColor(face_roi, cv2.COLOR_BGR2GRAY)
-        brightness = np.mean(gray)
-        brightness_score = 1.0 if 50 <= brightness <= 200 else (0.5 if 30 <= brightness <= 240 else 0.0)
-        brightness_feedback = "Good lighting" if brightness_score >= 0.7 else "Improve lighting"
-        
-        # Sharpness check
-        laplacian_var = cv2.Laplacian(gray, cv2.CV_64F).var()
-        sharpness_score = 1.0 if laplacian_var >= 100 else (0.5 if laplacian_var >= 50 else 0.0)
-        sharpness_feedback = "Image is sharp" if sharpness_score >= 0.7 else "Hold camera steady"
-        
-        # Face size check
-        face_width = right - left
-        face_height = bottom - top
-        size_score = 1.0 if face_width >= 150 and face_height >= 150 else (0.5 if face_width >= 100 else 0.0)
-        size_feedback = "Face size good" if size_score >= 0.7 else "Move closer to camera"
-        
-        # Overall quality score
-        quality_score = (brightness_score + sharpness_score + size_score) / 3
-        
-        # Status determination
-        if quality_score >= 0.8:
-            status = 'excellent'
-            message = '✓ Perfect! Ready to capture'
-        elif quality_score >= 0.5:
-            status = 'good'
-            message = 'Good quality - you can capture'
-        else:
-            status = 'poor'
-            message = 'Adjust position for better quality'
-        
-        return jsonify({
-            'success': True,
-            'has_face': True,
-            'quality_score': quality_score,
-            'feedback': {
-                'status': status,
-                'message': message,
-                'items': [
-                    {'check': 'Lighting', 'score': brightness_score, 'feedback': brightness_feedback},
-                    {'check': 'Sharpness', 'score': sharpness_score, 'feedback': sharpness_feedback},
-                    {'check': 'Face Size', 'score': size_score, 'feedback': size_feedback}
-                ]
-            }
-        }), 200
+        # Fast path: downscaled detection, box reuse, bounded concurrency
+        station_id = data.get('station_id') or f"{current_user.id}:{request.remote_addr}"
+        return jsonify(quality_assessor.assess(frame, station_id)), 200
         
     except Exception as e:
         logger.error(f"Error in quality assessment: {e}")
@@ -672,23 +657,7 @@ def enroll_face(current_user):
             }), 500
         
         try:
-            face_hash = face_service.compute_face_hash(face_encoding)
-            
-            student.face_encoding = face_encoding
-            student.face_hash = face_hash
-            
-            enroll_dir = os.path.join('static', 'enrollments')
-            ensure_dir(enroll_dir)
-            
-            image_filename = f"student_{student_id_str}.jpg"
-            image_path = os.path.join(enroll_dir, image_filename)
-            
-            cv2.imwrite(image_path, frame)
-            student.image_path = image_path
-            
-            db.session.commit()
-            
-            face_service.load_encodings_from_db()
+            save_enrollment(student, frame, face_encoding)
             
             logger.info(f"✓ Enrollment successful for {student.name}")
             
@@ -769,22 +738,7 @@ def enroll_multishot(current_user):
                     'message': message
                 }), 400
             
-            face_hash = face_service.compute_face_hash(face_encoding)
-            
-            student.face_encoding = face_encoding
-            student.face_hash = face_hash
-            
-            enroll_dir = os.path.join('static', 'enrollments')
-            ensure_dir(enroll_dir)
-            
-            image_filename = f"student_{student_id_str}.jpg"
-            image_path = os.path.join(enroll_dir, image_filename)
-            
-            cv2.imwrite(image_path, frame)
-            student.image_path = image_path
-            
-            db.session.commit()
-            face_service.load_encodings_from_db()
+            save_enrollment(student, frame, face_encoding)
             
             logger.info(f"✓ Multi-shot enrollment successful for {student.name}")
             
@@ -0,0 +1,161 @@
+# sampling_profiler.py - On-demand sampling profiler for frame-processing threads
+"""
+Time-boxed stack sampling of live frame processing, without a restart.
+
+Frame handlers register their thread for the duration of each frame
+(frame_scope); work they hand to executors carries the same scope (bind),
+and per-session detector threads register under their session. Shared
+worker threads (the micro-batchers) register with worker_scope and are
+sampled on request. A profile run periodically snapshots those threads with
+sys._current_frames() and aggregates the stacks in the collapsed format
+("outer;inner;leaf count") read by flamegraph.pl and speedscope.
+
+Overhead is hard-capped: if taking samples costs more than max_overhead
+of wall time, the interval is stretched until it fits.
+"""
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+MAX_STACK_DEPTH = 128
+_NO_SCOPE = object()
+
+
+class ProfilerBusy(Exception):
+    """A profile is already running"""
+
+
+class ProfileResult:
+    def __init__(self, stacks, samples, duration, sampling_time, session_id):
+        self.stacks = stacks
+        self.samples = samples
+        self.duration = duration
+        self.sampling_time = sampling_time
+        self.session_id = session_id
+
+    @property
+    def overhead(self):
+        return self.sampling_time / self.duration if self.duration > 0 else 0.0
+
+    def collapsed(self):
+        """Collapsed-stack text, heaviest stacks first"""
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common()) + "\n"
+
+    def to_dict(self):
+        return {
+            'session_id': self.session_id,
+            'samples': self.samples,
+            'duration_s': round(self.duration, 3),
+            'overhead': round(self.overhead, 4),
+            'stacks': dict(self.stacks.most_common())
+        }
+
+
+def _collapse(frame):
+    """Root-first 'func (file:line)' entries joined with ';'"""
+    entries = []
+    while frame is not None and len(entries) < MAX_STACK_DEPTH:
+        code = frame.f_code
+        entries.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+        frame = frame.f_back
+    entries.reverse()
+    return ';'.join(entries)
+
+
+class SamplingProfiler:
+    def __init__(self):
+        self._frame_threads = {}  # thread ident -> camera session id
+        self._worker_threads = {}  # thread ident -> worker name
+        self._run_lock = threading.Lock()
+
+    @contextmanager
+    def frame_scope(self, session_id=None):
+        """Mark the current thread as processing a frame for session_id (nests)"""
+        ident = threading.get_ident()
+        outer = self._frame_threads.get(ident, _NO_SCOPE)
+        self._frame_threads[ident] = session_id
+        try:
+            yield
+        finally:
+            if outer is _NO_SCOPE:
+                self._frame_threads.pop(ident, None)
+            else:
+                self._frame_threads[ident] = outer
+
+    def bind(self, fn):
+        """fn wrapped to run under the calling thread's frame_scope, for work handed to executors"""
+        session_id = self._frame_threads.get(threading.get_ident(), _NO_SCOPE)
+        if session_id is _NO_SCOPE:
+            return fn
+
+        def scoped(*args, **kwargs):
+            with self.frame_scope(session_id):
+                return fn(*args, **kwargs)
+        return scoped
+
+    @contextmanager
+    def worker_scope(self, name):
+        """Mark the current thread as a shared worker (serves every session)"""
+        ident = threading.get_ident()
+        self._worker_threads[ident] = name
+        try:
+            yield
+        finally:
+            self._worker_threads.pop(ident, None)
+
+    @property
+    def busy(self):
+        return self._run_lock.locked()
+
+    def profile(self, seconds, interval, session_id=None, max_overhead=0.02, include_workers=False):
+        """
+        Sample frame-processing threads for `seconds`
+        Only threads working on session_id frames are sampled when it is given.
+        include_workers also samples the shared worker threads (their batches
+        mix every session's work).
+        Raises ProfilerBusy if another profile is running.
+        """
+        if not self._run_lock.acquire(blocking=False):
+            raise ProfilerBusy()
+
+        try:
+            stacks = Counter()
+            samples = 0
+            sampling_time = 0.0
+            started = time.perf_counter()
+            deadline = started + seconds
+
+            while time.perf_counter() < deadline:
+                sample_start = time.perf_counter()
+
+                targets = [
+                    ident for ident, sid in list(self._frame_threads.items())
+                    if session_id is None or sid == session_id
+                ]
+                if include_workers:
+                    targets.extend(self._worker_threads)
+                if targets:
+                    frames = sys._current_frames()
+                    for ident in targets:
+                        frame = frames.get(ident)
+                        if frame is not None:
+                            stacks[_collapse(frame)] += 1
+                            samples += 1
+                    del frames
+
+                cost = time.perf_counter() - sample_start
+                sampling_time += cost
+
+                # Stretch the interval so sampling stays under max_overhead of wall time
+                delay = max(interval, cost / max_overhead - cost)
+                time.sleep(min(delay, max(0.0, deadline - time.perf_counter())))
+
+            return ProfileResult(stacks, samples, time.perf_counter() - started, sampling_time, session_id)
+        finally:
+            self._run_lock.release()
+
+
+profiler = SamplingProfiler()
@@ -0,0 +1,142 @@
+# background_detector.py - Per-camera detector threads running at their own cadence
+"""
+Runs a frame detector (the phone/screen detector) off the verification path.
+
+Each camera session gets one daemon thread. The frame path only offers its
+current frame; the thread takes one at most every 1/rate_hz seconds, runs
+the detector and publishes the detections with the frame's timestamp.
+Consumers read the latest detections and use them only while they are
+fresh enough, falling back to an inline detector pass otherwise.
+"""
+import logging
+import threading
+import time
+
+from sampling_profiler import profiler
+
+logger = logging.getLogger(__name__)
+
+
+class BackgroundDetector:
+    """
+    One detector thread for one camera session
+    detect_fn(frame, **context) returns detections, or None when no detector
+    is available (the thread then stops and latest() stays empty).
+    session_id tags the thread's detector passes for the sampling profiler.
+    """
+    def __init__(self, name, detect_fn, rate_hz, session_id=None):
+        self.detect_fn = detect_fn
+        self.session_id = session_id
+        self.interval = 1.0 / rate_hz
+        self.available = True
+        self._frame = None  # (frame copy, context, monotonic capture time)
+        self._wanted = True
+        self._result = None  # (detections, monotonic capture time)
+        self._stopped = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def offer(self, frame, **context):
+        """Hand over the current frame if the thread is due for one (copies only then)"""
+        with self._cond:
+            if not self._wanted or self._stopped:
+                return
+            self._frame = (frame.copy(), context, time.monotonic())
+            self._wanted = False
+            self._cond.notify()
+
+    def latest(self, max_age):
+        """(detections, age in seconds) if the last result is at most max_age old, else None"""
+        with self._cond:
+            result = self._result
+        if result is None:
+            return None
+        age = time.monotonic() - result[1]
+        if age > max_age:
+            return None
+        return result[0], age
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._frame is not None or self._stopped)
+                if self._stopped:
+                    return
+                frame, context, captured = self._frame
+                self._frame = None
+
+            started = time.monotonic()
+            failed = False
+            try:
+                with profiler.frame_scope(self.session_id):
+                    detections = self.detect_fn(frame, **context)
+            except Exception as e:
+                # Publish nothing: the last result goes stale and consumers
+                # fall back to their inline detector instead of seeing "no detections"
+                logger.error(f"Background detector error: {e}")
+                detections = None
+                failed = True
+            del frame
+
+            with self._cond:
+                if detections is None and not failed:
+                    self.available = False
+                    self._stopped = True
+                    return
+                if not failed:
+                    self._result = (detections, captured)
+
+                # Hold off until the next slot at the configured rate
+                remaining = self.interval - (time.monotonic() - started)
+                if remaining > 0:
+                    self._cond.wait_for(lambda: self._stopped, timeout=remaining)
+                self._wanted = True
+
+
+class BackgroundDetectorPool:
+    """
+    Background detectors keyed by camera session id
+    make_detector(session_id) returns the detect_fn for that session's thread.
+    """
+    def __init__(self, make_detector, rate_hz, name='detector'):
+        self.make_detector = make_detector
+        self.rate_hz = rate_hz
+        self.name = name
+        self._detectors = {}
+        self._lock = threading.Lock()
+
+    def offer(self, session_id, frame, **context):
+        with self._lock:
+            detector = self._detectors.get(session_id)
+            if detector is None:
+                detector = self._detectors[session_id] = BackgroundDetector(
+                    f"{self.name}-{session_id}", self.make_detector(session_id), self.rate_hz,
+                    session_id=session_id)
+        detector.offer(frame, **context)
+
+    def latest(self, session_id, max_age):
+        with self._lock:
+            detector = self._detectors.get(session_id)
+        if detector is None:
+            return None
+        return detector.latest(max_age)
+
+    def release(self, session_id):
+        """Stop a disconnected session's thread"""
+        with self._lock:
+            detector = self._detectors.pop(session_id, None)
+        if detector is not None:
+            detector.stop()
+
+    def stop_all(self):
+        with self._lock:
+            detectors = list(self._detectors.values())
+            self._detectors.clear()
+        for detector in detectors:
+            detector.stop()
@@ -0,0 +1,62 @@
+"""
+ONNX anti-spoof CNN (ResNet18: live / photo / screen)
+Model exported by convert_to_onnx.py (dynamic batch axis), preprocessing
+matches train_antispoofing.py: RGB, 224x224, ImageNet normalization.
+
+One InferenceSession is shared by every kiosk. InferenceSession.run is
+thread-safe, so concurrent checks run in parallel without a lock; each run
+uses intra_threads cores.
+"""
+import cv2
+import numpy as np
+import logging
+
+logger = logging.getLogger(__name__)
+
+CLASS_NAMES = ('live', 'photo', 'screen')
+IMAGENET_MEAN = np.array([0.485, 0.456, 0.406], dtype=np.float32)
+IMAGENET_STD = np.array([0.229, 0.224, 0.225], dtype=np.float32)
+
+
+def preprocess(face_rois, size=224):
+    """List of BGR face crops -> normalized (N, 3, size, size) float32 batch"""
+    batch = np.stack([cv2.resize(roi, (size, size), interpolation=cv2.INTER_LINEAR) for roi in face_rois])
+    batch = batch[..., ::-1].astype(np.float32)  # BGR -> RGB
+    batch *= 1.0 / 255.0
+    batch -= IMAGENET_MEAN
+    batch /= IMAGENET_STD
+    return np.ascontiguousarray(batch.transpose(0, 3, 1, 2))
+
+
+def softmax(logits):
+    exp = np.exp(logits - logits.max(axis=1, keepdims=True))
+    return exp / exp.sum(axis=1, keepdims=True)
+
+
+class SpoofCNN:
+    def __init__(self, model_path, input_size=224, intra_threads=0, inter_threads=0):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        if intra_threads:
+            options.intra_op_num_threads = intra_threads
+        if inter_threads:
+            options.inter_op_num_threads = inter_threads
+        self.session = ort.InferenceSession(model_path, options, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+        self.input_size = input_size
+        self.model_path = model_path
+
+    def predict(self, face_rois):
+        """
+        Class probabilities for a list of BGR face crops
+        Returns an (N, 3) array in CLASS_NAMES order.
+        """
+        logits = self.session.run(None, {self.input_name: preprocess(face_rois, self.input_size)})[0]
+        return softmax(logits.astype(np.float32))
+
+    def spoof_scores(self, face_rois):
+        """Spoof probability (1 - P(live)) per face"""
+        return 1.0 - self.predict(face_rois)[:, 0]
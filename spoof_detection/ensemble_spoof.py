@@ -6,44 +6,163 @@ import cv2
 import numpy as np
 import logging
 import os
-from functools import lru_cache
+import threading
+import time
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from config import Config
+from pipeline_metrics import stage_timer, registry as metrics
+from logging_setup import get_hot_path_logger
+from spoof_detection.background_detector import BackgroundDetectorPool
+from spoof_detection.onnx_phone_detector import OnnxPhoneDetector
+from inference_batcher import MicroBatcher
 
 logger = logging.getLogger(__name__)
+hot_logger = get_hot_path_logger(__name__)  # per-frame messages: sampled
 
 _cnn_model = None
 _yolo_model = None
 _yolo_load_attempted = False
 _cnn_load_attempted = False
 _cnn_available = False
+_yolo_lock = threading.Lock()
+_cnn_lock = threading.Lock()  # load only; inference runs unlocked
+_cnn_batcher = None
+_phone_batchers = {}  # detector input size -> MicroBatcher
+_batchers_lock = threading.Lock()
 
-# OPTIMIZED: Cache for expensive computations
-_texture_cache = {}
-_moire_cache = {}
-CACHE_SIZE = 50
+# Phone/screen classes: 67=cell phone, 73=laptop, 63=tv/monitor
+PHONE_CLASSES = [67, 73, 63]
+LARGE_SCREEN_AREA_RATIO = 0.12  # screens covering this much of the frame count wherever they are
 
-def load_yolo_model():
-    """Load YOLOv5 nano for phone detection"""
-    global _yolo_model, _yolo_load_attempted
-    
-    if _yolo_model is not None:
-        return _yolo_model
+SPOOF_THRESHOLD = 0.50
+SPOOF_CACHE_THUMB_SIZE = (16, 16)
+
+metrics.describe('attendance_spoof_cache_total', 'Spoof verdict cache lookups per tracked face')
+
+class SpoofVerdictCache:
+    """
+    Last spoof verdict per tracked face, reused within SPOOF_CACHE_TIMEOUT.
+    A fresh check is forced when the face looks different (face box, a tiny
+    gray thumbnail or the face encoding moved beyond tolerance) or when the
+    cached fusion score was within SPOOF_CACHE_BORDERLINE_MARGIN of the
+    decision threshold.
+    """
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._entries = {}  # track_id -> (result, signature, timestamp)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def signature(face_roi, face_bbox, face_encoding):
+        gray = cv2.cvtColor(cv2.resize(face_roi, SPOOF_CACHE_THUMB_SIZE, interpolation=cv2.INTER_AREA),
+                            cv2.COLOR_BGR2GRAY)
+        encoding = None if face_encoding is None else np.asarray(face_encoding, dtype=np.float64)
+        return tuple(face_bbox), gray.astype(np.int16), encoding
+
+    @staticmethod
+    def _changed(old, new):
+        (ox, oy, ow, oh), old_thumb, old_encoding = old
+        (nx, ny, nw, nh), new_thumb, new_encoding = new
+        size = max(ow, oh, 1)
+        if max(abs(ox - nx), abs(oy - ny), abs(ow - nw), abs(oh - nh)) > Config.SPOOF_CACHE_BOX_TOLERANCE * size:
+            return True
+        if np.mean(np.abs(old_thumb - new_thumb)) > Config.SPOOF_CACHE_APPEARANCE_THRESHOLD:
+            return True
+        if old_encoding is not None and new_encoding is not None:
+            if np.linalg.norm(old_encoding - new_encoding) > Config.SPOOF_CACHE_ENCODING_THRESHOLD:
+                return True
+        return False
+
+    def get(self, track_id, signature):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(track_id)
+            if entry is None:
+                return None
+            result, cached_signature, stamp = entry
+            if now - stamp > self.ttl or self._changed(cached_signature, signature):
+                del self._entries[track_id]
+                return None
+        cached = dict(result)
+        cached['evidence'] = dict(result['evidence'], cached=True, cache_age=round(now - stamp, 2))
+        return cached
+
+    def put(self, track_id, signature, result):
+        evidence = result.get('evidence') or {}
+        if 'error' in evidence:
+            return
+        score = evidence.get('fusion_score', result.get('confidence', 0.0))
+        if abs(score - SPOOF_THRESHOLD) < Config.SPOOF_CACHE_BORDERLINE_MARGIN:
+            return  # borderline: re-check every frame
+        now = time.time()
+        with self._lock:
+            for key in [k for k, e in self._entries.items() if now - e[2] > self.ttl]:
+                del self._entries[key]
+            self._entries[track_id] = (result, signature, now)
+
+    def release(self, session_id):
+        """Drop tracks of a camera session ((session_id, ...) keys)"""
+        with self._lock:
+            for key in [k for k in self._entries
+                        if k == session_id or (isinstance(k, tuple) and k[0] == session_id)]:
+                del self._entries[key]
+
+_verdict_cache = SpoofVerdictCache(Config.SPOOF_CACHE_TIMEOUT)
+
+def release_tracks(session_id):
+    """Forget cached verdicts and stop the phone detector of a disconnected camera session"""
+    _verdict_cache.release(session_id)
+    _phone_detectors.release(session_id)
+    with _crop_detectors_lock:
+        _crop_detectors.pop(session_id, None)
+
+def _load_onnx_phone_detector():
+    """ONNX Runtime detector (INT8 variant if configured and exported), or None"""
+    model_path = Config.PHONE_DETECTOR_ONNX_MODEL
+    if Config.PHONE_DETECTOR_USE_INT8:
+        if os.path.exists(Config.PHONE_DETECTOR_ONNX_INT8_MODEL):
+            model_path = Config.PHONE_DETECTOR_ONNX_INT8_MODEL
+        else:
+            logger.info("INT8 phone detector not found, using the float model")
     
-    if _yolo_load_attempted:
+    if not os.path.exists(model_path):
+        logger.info(f"ONNX phone detector not found at {model_path}")
         return None
     
-    _yolo_load_attempted = True
-    
-    model_path = 'models/yolov5n.pt'
+    try:
+        detector = OnnxPhoneDetector(
+            model_path,
+            PHONE_CLASSES,
+            conf_threshold=Config.PHONE_DETECTOR_CONFIDENCE,
+            iou_threshold=Config.PHONE_DETECTOR_NMS_IOU,
+            input_size=Config.PHONE_DETECTOR_INPUT_SIZE,
+            num_threads=Config.PHONE_DETECTOR_ONNX_THREADS
+        )
+        logger.info(f"✓ ONNX phone detector loaded from {model_path}")
+        if Config.PHONE_DETECTOR_CROP_MODE and not detector.dynamic:
+            logger.warning(f"Phone detector {model_path} has a static {detector.input_size}px input: face-crop "
+                           f"passes run at that size, not PHONE_DETECTOR_CROP_SIZE. Export with --dynamic "
+                           f"to make them cheaper.")
+        return detector
+    except ImportError:
+        logger.info("onnxruntime not installed. Cannot use the ONNX phone detector.")
+        return None
+    except Exception as e:
+        logger.info(f"Could not load ONNX phone detector: {e}")
+        return None
+
+def _load_ultralytics_phone_detector():
+    model_path = Config.PHONE_DETECTOR_MODEL
     if not os.path.exists(model_path):
         logger.info(f"YOLO model not found. Phone detection will use fallback method.")
         return None
     
     try:
         from ultralytics import YOLO
-        _yolo_model = YOLO(model_path)
-        _yolo_model.conf = 0.45  # OPTIMIZED: Balanced confidence
+        model = YOLO(model_path)
+        model.conf = 0.45  # OPTIMIZED: Balanced confidence
         logger.info("✓ YOLOv5 nano loaded for device detection")
-        return _yolo_model
+        return model
     except ImportError:
         logger.info("ultralytics not installed. Phone detection will use fallback.")
         return None
@@ -51,10 +170,91 @@ def load_yolo_model():
         logger.info(f"Could not load YOLO: {e}. Using fallback.")
         return None
 
-@lru_cache(maxsize=128)
-def calculate_laplacian_variance_cached(face_hash):
-    """Cached texture analysis using hash"""
-    return None  # Placeholder for cache lookup
+def load_yolo_model():
+    """
+    Load the phone detector selected by PHONE_DETECTOR_BACKEND
+    'onnx': onnxruntime only; 'ultralytics': YOLOv5 nano .pt only;
+    'auto': the ONNX export if present, else ultralytics.
+    """
+    global _yolo_model, _yolo_load_attempted
+    
+    if _yolo_model is not None:
+        return _yolo_model
+    
+    if _yolo_load_attempted:
+        return None
+    
+    with _yolo_lock:
+        if _yolo_load_attempted:
+            return _yolo_model
+        
+        backend = Config.PHONE_DETECTOR_BACKEND
+        model = None
+        if backend in ('onnx', 'auto'):
+            model = _load_onnx_phone_detector()
+        if model is None and backend in ('ultralytics', 'auto'):
+            model = _load_ultralytics_phone_detector()
+        
+        _yolo_model = model
+        _yolo_load_attempted = True
+        return model
+
+def load_cnn_model():
+    """Shared ONNX anti-spoof CNN session, or None if the model/onnxruntime is missing"""
+    global _cnn_model, _cnn_load_attempted, _cnn_available, _cnn_batcher
+    
+    if _cnn_load_attempted:
+        return _cnn_model
+    
+    with _cnn_lock:
+        if _cnn_load_attempted:
+            return _cnn_model
+        
+        model_path = Config.ANTI_SPOOF_CNN_MODEL
+        if not os.path.exists(model_path):
+            logger.info("Anti-spoof CNN not found. CNN stage disabled.")
+        else:
+            try:
+                from spoof_detection.cnn_spoof import SpoofCNN
+                _cnn_model = SpoofCNN(
+                    model_path,
+                    input_size=Config.ANTI_SPOOF_CNN_INPUT_SIZE,
+                    intra_threads=Config.ANTI_SPOOF_CNN_INTRA_THREADS,
+                    inter_threads=Config.ANTI_SPOOF_CNN_INTER_THREADS
+                )
+                _cnn_available = True
+                if Config.ENABLE_MICRO_BATCHING:
+                    _cnn_batcher = MicroBatcher(
+                        'anti_spoof_cnn',
+                        _cnn_model.spoof_scores,
+                        max_batch=Config.MICRO_BATCH_MAX_SIZE,
+                        max_wait_ms=Config.MICRO_BATCH_MAX_WAIT_MS
+                    )
+                logger.info(f"✓ Anti-spoof CNN loaded from {model_path}")
+            except ImportError:
+                logger.info("onnxruntime not installed. CNN stage disabled.")
+            except Exception as e:
+                logger.info(f"Could not load anti-spoof CNN: {e}. CNN stage disabled.")
+        
+        _cnn_load_attempted = True
+        return _cnn_model
+
+def calculate_cnn_spoof(face_roi):
+    """CNN spoof probability for one face, or None when the CNN is unavailable"""
+    model = load_cnn_model()
+    if model is None:
+        return None
+    try:
+        if _cnn_batcher is not None:
+            try:
+                # batched with other kiosks' faces
+                return float(_cnn_batcher(face_roi, timeout=Config.MICRO_BATCH_TIMEOUT_SECONDS))
+            except FutureTimeoutError:
+                logger.warning("CNN batch did not start in time, running unbatched")
+        return float(model.spoof_scores([face_roi])[0])
+    except Exception as e:
+        logger.error(f"CNN error: {e}")
+        return None
 
 def calculate_laplacian_variance(face_roi):
     """OPTIMIZED: Faster texture analysis"""
@@ -113,75 +313,220 @@ def calculate_fft_moire_fast(face_roi):
         logger.error(f"FFT error: {e}")
         return 0.0
 
-def detect_phone_in_frame_fast(frame, face_bbox):
-    """OPTIMIZED: Faster phone detection with aggressive blocking"""
-    model = load_yolo_model()
-    if model is None:
-        return check_phone_via_edges_fast(frame, face_bbox)
+def _detect_phone_batch(model, frames, input_size=None):
+    """Phone/screen detections for several frames in one model call"""
+    if isinstance(model, OnnxPhoneDetector):
+        return model.detect_batch(frames, input_size)  # letterboxes itself; class-filtered, frame coordinates
     
-    try:
-        # OPTIMIZED: Downsample frame for faster YOLO
+    # OPTIMIZED: Downsample frames for faster YOLO
+    scales = []
+    small_frames = []
+    for frame in frames:
         h, w = frame.shape[:2]
-        scale = 640 / max(h, w)
-        if scale < 1:
-            small_frame = cv2.resize(frame, None, fx=scale, fy=scale)
+        scale = (input_size or 640) / max(h, w)
+        scales.append(scale)
+        small_frames.append(cv2.resize(frame, None, fx=scale, fy=scale) if scale < 1 else frame)
+    
+    with _yolo_lock:  # one predictor shared by every camera thread
+        if input_size:
+            results = model(small_frames, imgsz=input_size, verbose=False)
         else:
-            small_frame = frame
-        
-        results = model(small_frame, verbose=False)
-        detections = results[0].boxes.data.cpu().numpy() if len(results) > 0 else []
-        
-        # Phone/screen classes: 67=cell phone, 73=laptop, 63=tv/monitor
-        phone_classes = [67, 73, 63]
+            results = model(small_frames, verbose=False)
+    
+    batch = []
+    for result, scale in zip(results, scales):
+        detections = result.boxes.data.cpu().numpy()
+        detections = detections[np.isin(detections[:, 5].astype(int), PHONE_CLASSES)]
         
-        fx1, fy1, fx2, fy2 = face_bbox
-        face_center_x = (fx1 + fx2) / 2
-        face_center_y = (fy1 + fy2) / 2
-        face_area = (fx2 - fx1) * (fy2 - fy1)
-        frame_area = frame.shape[0] * frame.shape[1]
-        
-        best_conf = 0.0
-        best_bbox = None
-        
-        for det in detections:
-            x1, y1, x2, y2, conf, cls = det
-            
-            # Scale back to original frame size
-            if scale < 1:
-                x1, y1, x2, y2 = x1/scale, y1/scale, x2/scale, y2/scale
-            
-            if int(cls) not in phone_classes:
-                continue
-            
-            phone_center_x = (x1 + x2) / 2
-            phone_center_y = (y1 + y2) / 2
-            dist = np.sqrt((phone_center_x - face_center_x)**2 + (phone_center_y - face_center_y)**2)
-            phone_area = (x2 - x1) * (y2 - y1)
-            
-            # CRITICAL: Phone directly over face
-            overlap_x = max(0, min(x2, fx2) - max(x1, fx1))
-            overlap_y = max(0, min(y2, fy2) - max(y1, fy1))
-            overlap_area = overlap_x * overlap_y
-            
-            if overlap_area > face_area * 0.25:
-                logger.warning(f"🚨 CRITICAL: Phone overlapping face!")
-                return 0.98, [int(x1), int(y1), int(x2-x1), int(y2-y1)]
-            
-            # Large screen in frame
-            if phone_area > frame_area * 0.12 and conf > 0.35:
-                logger.warning(f"🚨 Large screen detected")
-                return min(float(conf) + 0.25, 0.95), [int(x1), int(y1), int(x2-x1), int(y2-y1)]
-            
-            # Phone near face
-            if dist < 350 and conf > best_conf:
-                best_conf = float(conf) + 0.2
-                best_bbox = [int(x1), int(y1), int(x2-x1), int(y2-y1)]
-        
-        return best_conf, best_bbox
+        # Scale back to original frame size
+        if scale < 1:
+            detections[:, :4] /= scale
+        batch.append(detections)
+    return batch
+
+def _get_phone_batcher(model, input_size):
+    """One micro-batcher per detector input size (a batch must share it)"""
+    with _batchers_lock:
+        batcher = _phone_batchers.get(input_size)
+        if batcher is None:
+            batcher = _phone_batchers[input_size] = MicroBatcher(
+                f'phone_{input_size or 640}',
+                lambda frames: _detect_phone_batch(model, frames, input_size),
+                max_batch=Config.MICRO_BATCH_MAX_SIZE,
+                max_wait_ms=Config.MICRO_BATCH_MAX_WAIT_MS
+            )
+        return batcher
+
+def run_phone_detector(frame, input_size=None):
+    """
+    Run the phone detector on a frame (downsampled to input_size, default 640)
+    Returns an (N, 6) array of x1, y1, x2, y2, conf, cls rows for phone/screen
+    classes in frame coordinates, or None if no detector is available.
+    With ENABLE_MICRO_BATCHING, concurrent calls from all cameras share one model call.
+    """
+    model = load_yolo_model()
+    if model is None:
+        return None
+    
+    # A static-batch ONNX export runs frames one at a time anyway; calling the
+    # thread-safe session directly lets camera threads run in parallel
+    batchable = not isinstance(model, OnnxPhoneDetector) or model.batchable
+    if Config.ENABLE_MICRO_BATCHING and batchable:
+        try:
+            return _get_phone_batcher(model, input_size)(frame, timeout=Config.MICRO_BATCH_TIMEOUT_SECONDS)
+        except FutureTimeoutError:
+            logger.warning("Phone detector batch did not start in time, running unbatched")
+    return _detect_phone_batch(model, [frame], input_size)[0]
+
+def score_phone_detections(detections, face_bbox, frame_shape):
+    """
+    Phone confidence and evidence box for detections relative to a face
+    face_bbox: (x1, y1, x2, y2); returns (confidence, [x, y, w, h] or None)
+    """
+    fx1, fy1, fx2, fy2 = face_bbox
+    face_center_x = (fx1 + fx2) / 2
+    face_center_y = (fy1 + fy2) / 2
+    face_area = (fx2 - fx1) * (fy2 - fy1)
+    frame_area = frame_shape[0] * frame_shape[1]
+    
+    best_conf = 0.0
+    best_bbox = None
+    
+    for x1, y1, x2, y2, conf, cls in detections:
+        phone_center_x = (x1 + x2) / 2
+        phone_center_y = (y1 + y2) / 2
+        dist = np.sqrt((phone_center_x - face_center_x)**2 + (phone_center_y - face_center_y)**2)
+        phone_area = (x2 - x1) * (y2 - y1)
+        
+        # CRITICAL: Phone directly over face
+        overlap_x = max(0, min(x2, fx2) - max(x1, fx1))
+        overlap_y = max(0, min(y2, fy2) - max(y1, fy1))
+        overlap_area = overlap_x * overlap_y
+        
+        if overlap_area > face_area * 0.25:
+            logger.warning("🚨 CRITICAL: Phone overlapping face!")
+            return 0.98, [int(x1), int(y1), int(x2-x1), int(y2-y1)]
+        
+        # Large screen in frame
+        if phone_area > frame_area * LARGE_SCREEN_AREA_RATIO and conf > 0.35:
+            logger.warning("🚨 Large screen detected")
+            return min(float(conf) + 0.25, 0.95), [int(x1), int(y1), int(x2-x1), int(y2-y1)]
+        
+        # Phone near face
+        if dist < 350 and conf > best_conf:
+            best_conf = float(conf) + 0.2
+            best_bbox = [int(x1), int(y1), int(x2-x1), int(y2-y1)]
+    
+    return best_conf, best_bbox
+
+def face_crop_region(frame_shape, face_bbox, expand):
+    """Face box (x1, y1, x2, y2) grown by `expand` face sizes on every side, clipped to the frame"""
+    fx1, fy1, fx2, fy2 = face_bbox
+    margin = expand * max(fx2 - fx1, fy2 - fy1)
+    h, w = frame_shape[:2]
+    return (int(max(0, fx1 - margin)), int(max(0, fy1 - margin)),
+            int(min(w, fx2 + margin)), int(min(h, fy2 + margin)))
+
+class FaceCropPhoneDetector:
+    """
+    Phone detection for one camera, run on the face neighbourhood
+    The overlap and near-face rules only look around the face, so most passes
+    run on an expanded crop at PHONE_DETECTOR_CROP_SIZE. A full-frame pass
+    every PHONE_DETECTOR_FULL_FRAME_SECONDS catches large screens and devices
+    outside the crop; its large-screen and outside-the-crop detections are kept
+    until the next one. A crop covering more than PHONE_DETECTOR_CROP_MAX_AREA
+    of the frame (a large face on a small frame) saves little, so that pass
+    runs on the full frame instead.
+    """
+    def __init__(self):
+        self._full_detections = np.empty((0, 6), dtype=np.float32)
+        self._last_full_pass = None
+        self._lock = threading.Lock()
+
+    def __call__(self, frame, face_bbox=None):
+        now = time.monotonic()
+        with self._lock:
+            full_due = (self._last_full_pass is None or
+                        now - self._last_full_pass >= Config.PHONE_DETECTOR_FULL_FRAME_SECONDS)
+            full_detections = self._full_detections
+        
+        crop = None
+        if face_bbox is not None and not full_due and Config.PHONE_DETECTOR_CROP_MODE:
+            crop = face_crop_region(frame.shape, face_bbox, Config.PHONE_DETECTOR_CROP_EXPAND)
+            cx1, cy1, cx2, cy2 = crop
+            if (cx2 - cx1) * (cy2 - cy1) > frame.shape[0] * frame.shape[1] * Config.PHONE_DETECTOR_CROP_MAX_AREA:
+                crop = None
+        
+        if crop is None:
+            detections = run_phone_detector(frame)
+            if detections is not None:
+                with self._lock:
+                    self._full_detections = detections
+                    self._last_full_pass = now
+            return detections
+        
+        detections = run_phone_detector(frame[cy1:cy2, cx1:cx2], Config.PHONE_DETECTOR_CROP_SIZE)
+        if detections is None:
+            return None
+        
+        # Crop -> frame coordinates
+        detections[:, [0, 2]] += cx1
+        detections[:, [1, 3]] += cy1
+        
+        # Full-frame detections the crop cannot see (or only sees part of)
+        outside = ((full_detections[:, 2] <= cx1) | (full_detections[:, 0] >= cx2) |
+                   (full_detections[:, 3] <= cy1) | (full_detections[:, 1] >= cy2))
+        areas = (full_detections[:, 2] - full_detections[:, 0]) * (full_detections[:, 3] - full_detections[:, 1])
+        large = areas > frame.shape[0] * frame.shape[1] * LARGE_SCREEN_AREA_RATIO
+        return np.vstack([detections, full_detections[outside | large]])
+
+_crop_detectors = {}
+_crop_detectors_lock = threading.Lock()
+
+def _get_crop_detector(session_id):
+    with _crop_detectors_lock:
+        detector = _crop_detectors.get(session_id)
+        if detector is None:
+            detector = _crop_detectors[session_id] = FaceCropPhoneDetector()
+        return detector
+
+def detect_phone_in_frame_fast(frame, face_bbox, session_id=None):
+    """OPTIMIZED: Faster phone detection with aggressive blocking"""
+    try:
+        detections = _get_crop_detector(session_id)(frame, face_bbox)
+        if detections is None:
+            return check_phone_via_edges_fast(frame, face_bbox)
+        return score_phone_detections(detections, face_bbox, frame.shape)
     except Exception as e:
         logger.error(f"YOLO error: {e}")
         return check_phone_via_edges_fast(frame, face_bbox)
 
+_phone_detectors = BackgroundDetectorPool(_get_crop_detector, Config.PHONE_DETECTOR_RATE_HZ, name='phone')
+
+def submit_frame(session_id, frame, face_bbox=None):
+    """
+    Offer a camera's current frame to its background phone detector
+    face_bbox: (x1, y1, x2, y2) of the face to crop around; None for a full-frame pass
+    """
+    if Config.ENABLE_BACKGROUND_PHONE_DETECTOR:
+        _phone_detectors.offer(session_id, frame, face_bbox=face_bbox)
+
+def detect_phone(frame, face_bbox, session_id=None):
+    """
+    Phone confidence for a face, preferring fresh background detections
+    Returns (confidence, bbox, source) with source 'background' or 'inline'.
+    """
+    if session_id is not None and Config.ENABLE_BACKGROUND_PHONE_DETECTOR:
+        latest = _phone_detectors.latest(session_id, Config.PHONE_DETECTOR_MAX_AGE)
+        if latest is not None:
+            detections, _age = latest
+            phone_conf, phone_bbox = score_phone_detections(detections, face_bbox, frame.shape)
+            return phone_conf, phone_bbox, 'background'
+    
+    with stage_timer('yolo'):
+        phone_conf, phone_bbox = detect_phone_in_frame_fast(frame, face_bbox, session_id)
+    return phone_conf, phone_bbox, 'inline'
+
 def check_phone_via_edges_fast(frame, face_bbox):
     """OPTIMIZED: Faster edge-based phone detection"""
     try:
@@ -219,9 +564,10 @@ def check_phone_via_edges_fast(frame, face_bbox):
         logger.error(f"Edge detection error: {e}")
         return 0.0, None
 
-def check(frame, face_bbox, face_encoding=None):
+def check(frame, face_bbox, face_encoding=None, track_id=None):
     """
     OPTIMIZED: Fast but secure spoof detection
+    track_id: key of the tracked face; enables the verdict cache (ENABLE_SPOOF_CACHE)
     Returns: dict {is_spoof: bool, spoof_type: str or list, confidence: float, evidence: dict}
     """
     try:
@@ -236,12 +582,40 @@ def check(frame, face_bbox, face_encoding=None):
                 'evidence': {'error': 'invalid_face_roi'}
             }
         
+        session_id = track_id[0] if isinstance(track_id, tuple) else None
+        if track_id is None or not Config.ENABLE_SPOOF_CACHE:
+            return _check_face(frame, face_roi, x, y, w, h, session_id)
+        
+        signature = SpoofVerdictCache.signature(face_roi, face_bbox, face_encoding)
+        cached = _verdict_cache.get(track_id, signature)
+        if cached is not None:
+            metrics.inc('attendance_spoof_cache_total', result='hit')
+            return cached
+        
+        metrics.inc('attendance_spoof_cache_total', result='miss')
+        result = _check_face(frame, face_roi, x, y, w, h, session_id)
+        _verdict_cache.put(track_id, signature, result)
+        return result
+    except Exception as e:
+        logger.error(f"Spoof detection error: {e}")
+        # SAFE: Fail-closed on critical errors (block suspicious)
+        return {
+            'is_spoof': False,
+            'spoof_type': None,
+            'confidence': 0.0,
+            'evidence': {'error': str(e)}
+        }
+
+def _check_face(frame, face_roi, x, y, w, h, session_id=None):
+    """Run the texture, phone and CNN (or moire) stages on one face"""
+    try:
         # 1. TEXTURE ANALYSIS (fast)
-        texture_var = calculate_laplacian_variance(face_roi)
+        with stage_timer('spoof_texture'):
+            texture_var = calculate_laplacian_variance(face_roi)
         
         # CRITICAL: Emergency block for very low texture
         if texture_var < 22:
-            logger.critical(f"🚨 EMERGENCY BLOCK: texture={texture_var:.1f} < 22")
+            logger.critical("🚨 EMERGENCY BLOCK: texture=%.1f < 22", texture_var)
             return {
                 'is_spoof': True,
                 'spoof_type': ['extremely_low_texture', 'likely_photo'],
@@ -263,11 +637,11 @@ def check(frame, face_bbox, face_encoding=None):
             texture_conf = 0.0
         
         # 2. PHONE DETECTION (most important)
-        phone_conf, phone_bbox = detect_phone_in_frame_fast(frame, (x, y, x+w, y+h))
+        phone_conf, phone_bbox, phone_source = detect_phone(frame, (x, y, x+w, y+h), session_id)
         
         # CRITICAL: Strong phone detection blocks immediately
         if phone_conf > 0.7:
-            logger.critical(f"🚨 CRITICAL: Phone detected with high confidence: {phone_conf:.2f}")
+            logger.critical("🚨 CRITICAL: Phone detected with high confidence: %.2f", phone_conf)
             return {
                 'is_spoof': True,
                 'spoof_type': ['phone_in_frame', 'device_attack'],
@@ -275,20 +649,28 @@ def check(frame, face_bbox, face_encoding=None):
                 'evidence': {
                     'phone_confidence': phone_conf,
                     'phone_bbox': phone_bbox,
+                    'phone_source': phone_source,
                     'reason': 'PHONE_CRITICAL'
                 }
             }
         
-        # 3. QUICK MOIRE CHECK (only if suspicious)
+        # 3. CNN (when the ONNX model is available)
+        with stage_timer('cnn'):
+            cnn_conf = calculate_cnn_spoof(face_roi)
+        
+        # 4. QUICK MOIRE CHECK (only without the CNN, and only if suspicious)
         moire_conf = 0.0
-        if texture_var < 40 or phone_conf > 0.3:
-            moire_conf = calculate_fft_moire_fast(face_roi)
+        if cnn_conf is None and (texture_var < 40 or phone_conf > 0.3):
+            with stage_timer('moire'):
+                moire_conf = calculate_fft_moire_fast(face_roi)
         
-        # OPTIMIZED: Weighted scoring emphasizing phone and texture
+        # OPTIMIZED: Weighted scoring emphasizing phone and texture;
+        # the CNN fills the supporting slot, moire without it
+        support_conf = cnn_conf if cnn_conf is not None else moire_conf
         S = (
-            0.30 * texture_conf +    # Texture matters
-            0.55 * phone_conf +       # Phone is MOST important
-            0.15 * moire_conf         # Moire is supporting
+            Config.SPOOF_WEIGHT_TEXTURE * texture_conf +
+            Config.SPOOF_WEIGHT_PHONE * phone_conf +
+            Config.SPOOF_WEIGHT_CNN * support_conf
         )
         
         # Determine spoof types
@@ -299,21 +681,25 @@ def check(frame, face_bbox, face_encoding=None):
             spoof_types.append("low_texture_photo")
         if moire_conf > 0.65:
             spoof_types.append("screen_pattern")
+        if cnn_conf is not None and cnn_conf > 0.65:
+            spoof_types.append("cnn_spoof")
         
         # CRITICAL: Lower threshold for better security
-        is_spoof = S >= 0.50  # LOWERED from 0.55 for better blocking
+        is_spoof = S >= SPOOF_THRESHOLD  # LOWERED from 0.55 for better blocking
         spoof_type = spoof_types if spoof_types else None
         
         evidence = {
             'texture_variance': round(texture_var, 2),
             'phone_confidence': round(phone_conf, 2),
             'phone_bbox': phone_bbox,
+            'phone_source': phone_source,
             'moire_confidence': round(moire_conf, 2),
+            'cnn_confidence': None if cnn_conf is None else round(cnn_conf, 2),
             'fusion_score': round(S, 2)
         }
         
-        logger.info(f"Spoof: texture={texture_var:.1f}, phone={phone_conf:.2f}, "
-                   f"moire={moire_conf:.2f}, final={S:.2f}, is_spoof={is_spoof}")
+        hot_logger.info("Spoof: texture=%.1f, phone=%.2f, moire=%.2f, cnn=%s, final=%.2f, is_spoof=%s",
+                        texture_var, phone_conf, moire_conf, cnn_conf, S, is_spoof)
         
         return {
             'is_spoof': is_spoof,
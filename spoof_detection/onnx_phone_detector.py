@@ -0,0 +1,135 @@
+"""
+ONNX Runtime phone/screen detector
+Runs an exported YOLO detector on CPU without torch/ultralytics and keeps
+only the phone/screen classes. Post-processing is NumPy + cv2 NMS.
+
+Handles both export layouts:
+    (1, N, 85)  YOLOv5: cx, cy, w, h, objectness, 80 class scores
+    (1, 84, N)  YOLOv8 / v5u: cx, cy, w, h, 80 class scores
+"""
+import cv2
+import numpy as np
+import logging
+
+logger = logging.getLogger(__name__)
+
+COCO_CLASSES = 80
+LETTERBOX_FILL = 114
+
+
+def letterbox(frame, size):
+    """
+    Resize keeping aspect ratio and pad to size x size
+    Returns (image, scale, pad_x, pad_y)
+    """
+    h, w = frame.shape[:2]
+    scale = min(size / h, size / w)
+    new_w, new_h = int(round(w * scale)), int(round(h * scale))
+    resized = cv2.resize(frame, (new_w, new_h), interpolation=cv2.INTER_LINEAR) if scale != 1 else frame
+
+    pad_x = (size - new_w) // 2
+    pad_y = (size - new_h) // 2
+    image = np.full((size, size, 3), LETTERBOX_FILL, dtype=np.uint8)
+    image[pad_y:pad_y + new_h, pad_x:pad_x + new_w] = resized
+    return image, scale, pad_x, pad_y
+
+
+def to_blob(image, dtype=np.float32):
+    """BGR HWC uint8 -> RGB NCHW in [0, 1]"""
+    blob = cv2.cvtColor(image, cv2.COLOR_BGR2RGB).transpose(2, 0, 1)[np.newaxis]
+    return np.ascontiguousarray(blob, dtype=dtype) / dtype(255.0)
+
+
+def postprocess(output, classes, conf_threshold, iou_threshold):
+    """
+    Raw detector output -> (N, 6) array of x1, y1, x2, y2, conf, cls in
+    letterboxed input coordinates, filtered to `classes` and NMS'd per class
+    """
+    preds = np.squeeze(output, axis=0)
+    if preds.shape[0] < preds.shape[1]:  # (84, N) -> (N, 84)
+        preds = preds.T
+
+    has_objectness = preds.shape[1] == COCO_CLASSES + 5
+    class_offset = 5 if has_objectness else 4
+    classes = np.asarray(classes)
+
+    scores = preds[:, class_offset + classes]
+    if has_objectness:
+        scores = scores * preds[:, 4:5]
+
+    best = np.argmax(scores, axis=1)
+    conf = scores[np.arange(len(scores)), best]
+    keep = conf >= conf_threshold
+    if not np.any(keep):
+        return np.empty((0, 6), dtype=np.float32)
+
+    boxes = preds[keep, :4]
+    conf = conf[keep]
+    cls = classes[best[keep]]
+
+    xyxy = np.empty_like(boxes)
+    xyxy[:, :2] = boxes[:, :2] - boxes[:, 2:4] / 2
+    xyxy[:, 2:4] = boxes[:, :2] + boxes[:, 2:4] / 2
+
+    # Class-aware NMS in one call: shift each class into its own region
+    offset = cls[:, np.newaxis] * 4096.0
+    nms_boxes = np.column_stack([xyxy[:, :2] + offset, boxes[:, 2:4]])
+    indices = cv2.dnn.NMSBoxes(nms_boxes.tolist(), conf.tolist(), conf_threshold, iou_threshold)
+    indices = np.asarray(indices, dtype=int).reshape(-1)
+
+    return np.column_stack([xyxy[indices], conf[indices], cls[indices]]).astype(np.float32)
+
+
+class OnnxPhoneDetector:
+    """Callable detector: frame -> (N, 6) phone/screen detections in frame coordinates"""
+
+    def __init__(self, model_path, classes, conf_threshold=0.25, iou_threshold=0.45,
+                 input_size=640, num_threads=0):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        # InferenceSession.run is thread-safe: camera threads share one session
+        self.session = ort.InferenceSession(model_path, options, providers=['CPUExecutionProvider'])
+
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        self.input_dtype = np.float16 if 'float16' in model_input.type else np.float32
+        height = model_input.shape[2] if len(model_input.shape) == 4 else None
+        self.dynamic = not isinstance(height, int)  # exported with --dynamic: any input and batch size
+        self.input_size = input_size if self.dynamic else height
+        self.batchable = not isinstance(model_input.shape[0], int)
+
+        self.classes = list(classes)
+        self.conf_threshold = conf_threshold
+        self.iou_threshold = iou_threshold
+        self.model_path = model_path
+
+    def __call__(self, frame, input_size=None):
+        """input_size only applies to dynamic-shape exports; static ones run at their exported size"""
+        return self.detect_batch([frame], input_size)[0]
+
+    def detect_batch(self, frames, input_size=None):
+        """One session run for all frames when the export has a dynamic batch axis"""
+        size = input_size if input_size and self.dynamic else self.input_size
+        boxes = [letterbox(frame, size) for frame in frames]
+        blobs = [to_blob(image, self.input_dtype) for image, _, _, _ in boxes]
+
+        if self.batchable:
+            outputs = self.session.run(None, {self.input_name: np.concatenate(blobs)})[0]
+        else:
+            outputs = np.concatenate([self.session.run(None, {self.input_name: blob})[0] for blob in blobs])
+
+        results = []
+        for i, (frame, (_, scale, pad_x, pad_y)) in enumerate(zip(frames, boxes)):
+            detections = postprocess(outputs[i:i + 1].astype(np.float32), self.classes,
+                                     self.conf_threshold, self.iou_threshold)
+            if len(detections):
+                # Undo the letterbox and clip to the frame
+                h, w = frame.shape[:2]
+                detections[:, [0, 2]] = np.clip((detections[:, [0, 2]] - pad_x) / scale, 0, w)
+                detections[:, [1, 3]] = np.clip((detections[:, [1, 3]] - pad_y) / scale, 0, h)
+            results.append(detections)
+        return results
@@ -108,11 +108,18 @@ class AttendanceDashboard {
     this.boundPanelKeydownHandler = null;
     
     this.isCapturing = false;
-    this.capturedFrames = [];
+    this.capturedFrameCount = 0;
+    this.lastCapturedFrame = null;
     this.targetFrameCount = 7;
     this.qualityCheckInterval = null;
     this.captureInterval = null;
 
+    // Streaming enrollment: frames are scored and buffered server-side
+    this.bufferedFrameCount = 0;
+    this.minEnrollFrames = 3;
+    this.enrollFramePending = false;
+    this.enrollResultResolver = null;
+
     this.initializeEventListeners();
     this.loadInitialData();
   }
@@ -140,7 +147,7 @@ class AttendanceDashboard {
     
     this.enrollSubmitBtn.addEventListener("click", (e) => {
         e.preventDefault();
-        if (this.capturedFrames.length >= this.targetFrameCount) {
+        if (this.bufferedFrameCount >= this.minEnrollFrames) {
             this.submitEnrollment();
         } else {
             this.showNotification("Please capture photos first.", "warning");
@@ -172,6 +179,34 @@ class AttendanceDashboard {
       this.handleActivityUpdate(data);
     });
     
+    this.socket.on('event_summary', (data) => {
+      this.handleEventSummary(data);
+    });
+    
+    this.socket.on("enroll_ready", (data) => {
+      this.minEnrollFrames = data.min_frames || this.minEnrollFrames;
+    });
+
+    this.socket.on("enroll_quality", (data) => {
+      this.enrollFramePending = false;
+      this.bufferedFrameCount = data.buffered || 0;
+      if (!this.isCapturing && data.feedback) {
+        this.updateQualityUI(data);
+      }
+    });
+
+    this.socket.on("enroll_result", (data) => {
+      if (this.enrollResultResolver) {
+        this.enrollResultResolver(data);
+        this.enrollResultResolver = null;
+      }
+    });
+
+    this.socket.on("enroll_error", (data) => {
+      this.enrollFramePending = false;
+      console.error('Enrollment session error:', data.message);
+    });
+
     this.socket.on("system_started", () => this.updateSystemStatus(true));
     this.socket.on("system_stopped", () => this.updateSystemStatus(false));
 
@@ -456,6 +491,28 @@ class AttendanceDashboard {
     console.log(`📋 Event logged: ${message}`);
   }
 
+  handleEventSummary(data) {
+    const eventLabels = {
+      'unknown_face': '❓ Unknown face',
+      'camera_obstructed': '🚫 Camera feed obstructed'
+    };
+    
+    const label = eventLabels[data.type] || data.type;
+    let message = label;
+    if (data.final) {
+      const seconds = Math.max(1, Math.round((new Date(data.last_seen) - new Date(data.first_seen)) / 1000));
+      message = `${label} ×${data.count} over ${seconds}s`;
+      if (data.best_confidence !== null && data.best_confidence !== undefined) {
+        message += ` (best ${(data.best_confidence * 100).toFixed(0)}%)`;
+      }
+    }
+    
+    this.addRecentEvent({
+      student_name: message,
+      time_in: data.final ? data.last_seen : data.first_seen
+    });
+  }
+
   async startVideoStream() {
     if (this.videoStream) return;
     try {
@@ -604,6 +661,7 @@ class AttendanceDashboard {
     }
     this.enrollModal.classList.add('show');
     this.resetCaptureUI();
+    this.socket.emit('enroll_start', { token });
     await this.startVideoStream();
     
     setTimeout(() => {
@@ -615,6 +673,7 @@ class AttendanceDashboard {
     this.stopVideoStream();
     this.stopQualityMonitoring();
     this.resetCapture();
+    this.socket.emit('enroll_cancel');
     
     this.enrollModal.classList.remove('show');
     this.enrollForm.reset();
@@ -873,8 +932,8 @@ class AttendanceDashboard {
     this.qualityFeedback.style.display = 'block';
     
     this.qualityCheckInterval = setInterval(() => {
-      this.checkFrameQuality();
-    }, 500);
+      this.sendEnrollFrame(false);
+    }, 300);
   }
 
   stopQualityMonitoring() {
@@ -892,36 +951,31 @@ class AttendanceDashboard {
     }
   }
 
-  async checkFrameQuality() {
-    if (!this.videoPreview || !this.videoPreview.srcObject) {
-      return;
+  // Stream a modest-quality preview frame; the server scores it and, during
+  // capture, keeps it if it is among the best frames seen so far
+  sendEnrollFrame(capture) {
+    if (!this.videoPreview || !this.videoPreview.srcObject || this.enrollFramePending) {
+      return null;
     }
     
     try {
+      const scale = Math.min(1, 640 / (this.videoPreview.videoWidth || 640));
       const canvas = document.createElement('canvas');
-      canvas.width = this.videoPreview.videoWidth;
-      canvas.height = this.videoPreview.videoHeight;
+      canvas.width = Math.round(this.videoPreview.videoWidth * scale);
+      canvas.height = Math.round(this.videoPreview.videoHeight * scale);
       const ctx = canvas.getContext('2d');
-      ctx.drawImage(this.videoPreview, 0, 0);
-      
-      const frameData = canvas.toDataURL('image/jpeg', 0.8).split(',')[1];
       
-      const response = await fetch('/api/assess-quality', {
-        method: 'POST',
-        headers: {
-          'Content-Type': 'application/json',
-          'Authorization': `Bearer ${token}`
-        },
-        body: JSON.stringify({ frame: frameData })
-      });
-      
-      const result = await response.json();
+      ctx.translate(canvas.width, 0);
+      ctx.scale(-1, 1);
+      ctx.drawImage(this.videoPreview, 0, 0, canvas.width, canvas.height);
       
-      if (result.success) {
-        this.updateQualityUI(result);
-      }
+      const frameData = canvas.toDataURL('image/jpeg', 0.7).split(',')[1];
+      this.enrollFramePending = true;
+      this.socket.emit('enroll_frame', { frame: frameData, capture: capture });
+      return frameData;
     } catch (error) {
-      console.error('Quality check error:', error);
+      console.error('Enrollment frame error:', error);
+      return null;
     }
   }
 
@@ -965,10 +1019,13 @@ class AttendanceDashboard {
     }
 
     this.isCapturing = true;
-    this.capturedFrames = [];
+    this.capturedFrameCount = 0;
+    this.bufferedFrameCount = 0;
     
-    // Stop quality monitoring during capture
+    // Stop quality monitoring during capture and start a fresh server buffer
     this.stopQualityMonitoring();
+    this.enrollFramePending = false;
+    this.socket.emit('enroll_start', { token });
     
     this.captureBtn.classList.add('hidden');
     this.recaptureBtn.classList.add('hidden');
@@ -996,38 +1053,28 @@ class AttendanceDashboard {
   }
 
   captureFrame() {
-    if (this.capturedFrames.length >= this.targetFrameCount) {
+    if (this.capturedFrameCount >= this.targetFrameCount) {
       this.finishCapture();
       return;
     }
     
-    try {
-      const canvas = document.createElement('canvas');
-      canvas.width = this.videoPreview.videoWidth;
-      canvas.height = this.videoPreview.videoHeight;
-      const ctx = canvas.getContext('2d');
-      
-      ctx.translate(canvas.width, 0);
-      ctx.scale(-1, 1);
-      ctx.drawImage(this.videoPreview, 0, 0);
-      
-      const frameData = canvas.toDataURL('image/jpeg', 0.95).split(',')[1];
-      this.capturedFrames.push(frameData);
-      
-      this.updateFrameCount();
-      
-      this.frameIndicator.style.borderColor = '#00E0F0';
-      setTimeout(() => {
-        this.frameIndicator.style.borderColor = 'rgba(0, 224, 240, 0.5)';
-      }, 100);
-      
-    } catch (error) {
-      console.error('Frame capture error:', error);
+    const frameData = this.sendEnrollFrame(true);
+    if (!frameData) {
+      return;
     }
+    
+    this.capturedFrameCount++;
+    this.lastCapturedFrame = frameData;
+    this.updateFrameCount();
+    
+    this.frameIndicator.style.borderColor = '#00E0F0';
+    setTimeout(() => {
+      this.frameIndicator.style.borderColor = 'rgba(0, 224, 240, 0.5)';
+    }, 100);
   }
 
   updateFrameCount() {
-    this.frameCount.textContent = this.capturedFrames.length;
+    this.frameCount.textContent = this.capturedFrameCount;
   }
 
   finishCapture() {
@@ -1044,7 +1091,7 @@ class AttendanceDashboard {
     this.recaptureBtn.classList.remove('hidden');
     this.enrollSubmitBtn.disabled = false;
     
-    const lastFrameData = this.capturedFrames[this.capturedFrames.length - 1];
+    const lastFrameData = this.lastCapturedFrame;
     const img = new Image();
     img.onload = () => {
       const ctx = this.photoCanvas.getContext('2d');
@@ -1131,20 +1178,8 @@ class AttendanceDashboard {
         }
       }
 
-      console.log('Enrolling face (multi-shot)...');
-      const enrollResponse = await fetch('/api/enroll-multishot', {
-        method: 'POST',
-        headers: {
-          'Content-Type': 'application/json',
-          'Authorization': `Bearer ${token}` 
-        },
-        body: JSON.stringify({
-          student_id: studentId,
-          frames: this.capturedFrames
-        })
-      });
-      
-      const result = await enrollResponse.json();
+      console.log('Enrolling face from server-side frame buffer...');
+      const result = await this.commitEnrollment(studentId);
       
       if (result.success) {
         this.showNotification(`✅ ${result.message || 'Student enrolled successfully!'}`, "success");
@@ -1163,8 +1198,18 @@ class AttendanceDashboard {
     }
   }
 
+  commitEnrollment(studentId) {
+    return new Promise((resolve) => {
+      this.enrollResultResolver = resolve;
+      this.socket.emit('enroll_commit', { student_id: studentId });
+    });
+  }
+
   resetCapture() {
-    this.capturedFrames = [];
+    this.capturedFrameCount = 0;
+    this.lastCapturedFrame = null;
+    this.bufferedFrameCount = 0;
+    this.enrollFramePending = false;
     this.isCapturing = false;
     if (this.frameIndicator) this.frameIndicator.style.display = 'none';
     if (this.captureProgress) this.captureProgress.style.display = 'none';
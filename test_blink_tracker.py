@@ -0,0 +1,45 @@
+# test_blink_tracker.py - BlinkTracker must not count landmark jitter as a blink
+import numpy as np
+import pytest
+
+pytest.importorskip('dlib')
+
+from liveness_detection import BlinkTracker
+
+FPS = 15
+OPEN_EAR = 0.30
+
+
+def feed(tracker, ears, start=0.0):
+    """Add EAR samples at FPS; returns the number of blinks completed"""
+    return sum(tracker.add(ear, now=start + i / FPS) for i, ear in enumerate(ears))
+
+
+def test_jitter_alone_is_not_a_blink():
+    rng = np.random.default_rng(7)
+    for _ in range(20):
+        tracker = BlinkTracker()
+        ears = OPEN_EAR + rng.normal(0.0, 0.03, 8 * FPS)  # 8 s of a still photo
+        assert feed(tracker, ears) == 0
+        assert not tracker.recently_blinked(now=8.0)
+
+
+def test_single_dipped_sample_is_not_a_blink():
+    tracker = BlinkTracker()
+    ears = [OPEN_EAR] * 20 + [0.12] + [OPEN_EAR] * 20
+    assert feed(tracker, ears) == 0
+
+
+def test_real_blink_is_detected_once():
+    rng = np.random.default_rng(7)
+    tracker = BlinkTracker()
+    ears = np.r_[np.full(20, OPEN_EAR), [0.20, 0.10, 0.12, 0.22], np.full(20, OPEN_EAR)]
+    ears = ears + rng.normal(0.0, 0.01, len(ears))
+    assert feed(tracker, ears) == 1
+    assert tracker.recently_blinked(now=len(ears) / FPS)
+
+
+def test_closed_run_counts_trailing_dipped_samples():
+    tracker = BlinkTracker()
+    feed(tracker, [OPEN_EAR] * 10 + [0.12, 0.11])
+    assert tracker.closed_run() == 2